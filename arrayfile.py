@@ -0,0 +1,174 @@
+"""
+Small self-describing binary array container shared by the homework scripts
+
+Layout of a container file:
+
+    8 bytes   magic b'\x93ARRFILE'
+    4 bytes   header length, little-endian uint32
+    header    JSON: dtype (with byte order), shape, order ('C' or 'F'),
+              checksum (CRC-32 of the data bytes), space-padded so the
+              data starts on a 64-byte boundary
+    data      the raw array bytes
+
+load_array opens containers as read-only np.memmap views without copying.
+It also reads .npy files (memory-mapped) and headerless .raw/.bin files,
+for which the caller still has to supply dtype and shape.
+
+The homework scripts import this module with the repository root on
+PYTHONPATH (see README.md).
+"""
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'\x93ARRFILE'
+ALIGNMENT = 64
+ARRAY_SUFFIX = '.arr'
+CHUNK_BYTES = 1 << 25       # 32 MB per write/checksum step
+_LENGTH = struct.Struct('<I')
+_CHECKSUM_PLACEHOLDER = '0' * 8
+
+
+def _header_bytes(dtype, shape, order, checksum):
+    header = json.dumps({
+        'dtype': np.dtype(dtype).str,
+        'shape': [int(size) for size in shape],
+        'order': order,
+        'checksum': checksum,
+    }).encode('ascii')
+    prefix = len(MAGIC) + _LENGTH.size
+    padded = -(-(prefix + len(header) + 1) // ALIGNMENT) * ALIGNMENT - prefix
+    header = header + b' ' * (padded - len(header) - 1) + b'\n'
+    return MAGIC + _LENGTH.pack(len(header)) + header
+
+
+def is_array_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_header(path):
+    """
+    Read a container header
+
+    Returns:
+    dict: dtype, shape, order, checksum and the byte offset of the data
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an array container")
+        (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+        header = json.loads(f.read(length).decode('ascii'))
+    header['offset'] = len(MAGIC) + _LENGTH.size + length
+    header['shape'] = tuple(header['shape'])
+    return header
+
+
+def write_array_chunks(path, chunks, dtype, shape, order='C'):
+    """
+    Write a container from an iterable of array chunks
+
+    The chunks are written in sequence as the flattened data (in `order`),
+    so an array never has to be in memory at once. The header is rewritten
+    with the checksum once all data is written.
+    """
+    dtype = np.dtype(dtype)
+    expected = int(np.prod(shape)) * dtype.itemsize
+    checksum = 0
+    written = 0
+    with open(path, 'wb') as f:
+        f.write(_header_bytes(dtype, shape, order, _CHECKSUM_PLACEHOLDER))
+        for chunk in chunks:
+            data = np.ascontiguousarray(chunk, dtype=dtype).tobytes()
+            checksum = zlib.crc32(data, checksum)
+            written += len(data)
+            f.write(data)
+        if written != expected:
+            raise ValueError(f"{path}: wrote {written} bytes but shape {tuple(shape)} of {dtype} "
+                             f"needs {expected}")
+        f.seek(0)
+        f.write(_header_bytes(dtype, shape, order, f'{checksum:08x}'))
+
+
+def save_array(path, array):
+    """
+    Save an array (or memmap) to a container file, chunk by chunk
+
+    Fortran-ordered arrays are stored as they are, with order 'F'.
+    """
+    array = np.asanyarray(array)
+    order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+    flat = array.T if order == 'F' else array
+    rows = max(1, CHUNK_BYTES // max(1, flat.itemsize * int(np.prod(flat.shape[1:]))))
+    if flat.ndim:
+        chunks = (flat[begin:begin + rows] for begin in range(0, len(flat), rows))
+    else:
+        chunks = [flat]
+    write_array_chunks(path, chunks, array.dtype, array.shape, order)
+
+
+def _check_expected(path, dtype, shape, found_dtype, found_shape):
+    if dtype is not None and np.dtype(dtype) != np.dtype(found_dtype):
+        raise ValueError(f"{path} holds {np.dtype(found_dtype)} data, not {np.dtype(dtype)}")
+    if shape is not None and tuple(shape) != tuple(found_shape):
+        raise ValueError(f"{path} has shape {tuple(found_shape)}, not {tuple(shape)}")
+
+
+def load_array(path, dtype=None, shape=None, offset=0):
+    """
+    Open an array file read-only without copying its data
+
+    Parameters:
+    path (str): Container, .npy or headerless raw file
+    dtype (dtype): Expected dtype. Required for headerless files; for
+        containers and .npy files a mismatch raises ValueError instead of
+        silently reinterpreting the bytes
+    shape (tuple): Expected shape, checked the same way. For headerless
+        files it may contain one -1, and defaults to 1D
+    offset (int): Bytes to skip at the start of a headerless file
+
+    Returns:
+    ndarray: A read-only np.memmap (or the loaded .npy memmap)
+    """
+    if is_array_file(path):
+        header = read_header(path)
+        _check_expected(path, dtype, shape, header['dtype'], header['shape'])
+        if int(np.prod(header['shape'])) == 0:
+            return np.empty(header['shape'], dtype=header['dtype'], order=header['order'])
+        return np.memmap(path, dtype=header['dtype'], mode='r', offset=header['offset'],
+                         shape=header['shape'], order=header['order'])
+
+    if path.endswith('.npy'):
+        array = np.load(path, mmap_mode='r')
+        _check_expected(path, dtype, shape, array.dtype, array.shape)
+        return array
+
+    if dtype is None:
+        raise ValueError(f"{path} has no header, pass its dtype")
+    dtype = np.dtype(dtype)
+    size, remainder = divmod(os.path.getsize(path) - offset, dtype.itemsize)
+    if remainder:
+        raise ValueError(f"{path}: {size * dtype.itemsize + remainder} bytes is not a whole "
+                         f"number of {dtype} items")
+    shape = (size,) if shape is None else tuple(shape)
+    if -1 in shape:
+        known = int(np.prod([s for s in shape if s != -1]))
+        shape = tuple(size // known if s == -1 else s for s in shape)
+    if int(np.prod(shape)) != size:
+        raise ValueError(f"{path} holds {size} {dtype} items, which does not fit shape {shape}")
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def verify_array(path):
+    # Recompute the CRC-32 of a container's data and compare it with the header
+    header = read_header(path)
+    checksum = 0
+    with open(path, 'rb') as f:
+        f.seek(header['offset'])
+        for block in iter(lambda: f.read(CHUNK_BYTES), b''):
+            checksum = zlib.crc32(block, checksum)
+    return f'{checksum:08x}' == header['checksum']
+
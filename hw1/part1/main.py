@@ -1,13 +1,18 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.stats import gaussian_kde
+
+from arrayfile import load_array, save_array
+from streaming import (binned_kde, box_plot_stats, compute_histogram, density_grid, quantile_sketch,
+                       rasterize_points, shade)
 
 # Function to plot box plot
+# data may be an array, an array file path, a chunk iterable or a QuantileSketch
 def box_plot(data, label = None):
+    sketch = quantile_sketch(data)
     fig = plt.figure(figsize =(10, 7))
     ax = fig.add_axes([0.1, 0.1, 0.8, 0.8])
     # ax = fig.add_subplot(111)
-    bp = ax.boxplot(data, labels=[label])
+    bp = ax.bxp([box_plot_stats(sketch, label)])
     plt.title('Box plot of random numbers', fontsize=20)
     plt.xlabel('Distribution', fontsize=15)
     plt.ylabel('Values', fontsize=15)
@@ -17,19 +22,9 @@ def box_plot(data, label = None):
 
 # Function to plot histogram with 20 bins
 def histogram(data, num_bins=20, label=None):
-    data_min = np.min(data)
-    data_max = np.max(data)
-    bin_width = (data_max - data_min) / num_bins
-    
-    bin_edges = np.arange(data_min, data_max + bin_width, bin_width)
-    freq = [0] * num_bins
-
-    for value in data:
-        for i in range(num_bins):
-            if bin_edges[i] <= value < bin_edges[i+1]:
-                freq[i] += 1
-                
-        
+    freq, bin_edges = compute_histogram(data, num_bins)
+    bin_width = bin_edges[1] - bin_edges[0]
+
     plt.bar(bin_edges[:-1], freq, width=bin_width, label=label)
     plt.title('Histogram of random numbers', fontsize=20)
     plt.xlabel('Values', fontsize=15)
@@ -40,9 +35,11 @@ def histogram(data, num_bins=20, label=None):
     # plt.show()
 
 # line graph cumulatively showing the number of values that fall within each bin
-def cumulative_chart(data, num_bins=20, label=None):
-    sorted_data = np.sort(data)
-    cumulative = np.arange(1, len(sorted_data) + 1) / len(sorted_data)
+# The CDF is drawn from num_points quantiles of a sketch instead of sorting all of data
+def cumulative_chart(data, num_bins=20, label=None, num_points=512):
+    sketch = quantile_sketch(data)
+    cumulative = np.linspace(0, 1, num_points)
+    sorted_data = sketch.quantile(cumulative)
 
     fig = plt.figure(figsize=(10, 7))
     ax = fig.add_axes([0.1, 0.1, 0.8, 0.8])
@@ -56,10 +53,19 @@ def cumulative_chart(data, num_bins=20, label=None):
     # plt.show()
 
 # 2d array scatter plot
-def scatter_plot(x, y, label=None):
+# With rasterize=True the points are aggregated into a canvas_size pixel
+# image instead of one marker each, so the cost scales with the canvas
+def scatter_plot(x, y, label=None, rasterize=False, canvas_size=(800, 600), reducer='count',
+                 values=None, how='eq_hist'):
     fig = plt.figure(figsize =(10, 7))
     ax = fig.add_axes([0.1, 0.1, 0.8, 0.8])
-    ax.scatter(x, y, label=label)
+    if rasterize:
+        canvas, ((xmin, xmax), (ymin, ymax)), counts = rasterize_points(x, y, values, *canvas_size, reducer=reducer,
+                                                                        return_counts=True)
+        ax.imshow(shade(canvas, how, counts=counts), origin='lower', aspect='auto', extent=[xmin, xmax, ymin, ymax],
+                  interpolation='nearest')
+    else:
+        ax.scatter(x, y, label=label)
     plt.title(f'Scatter plot of {label} random numbers', fontsize=20)
     plt.xlabel('X', fontsize=15)
     plt.ylabel('Y', fontsize=15)
@@ -67,7 +73,7 @@ def scatter_plot(x, y, label=None):
     plt.close()
     # plt.show()
 
-def count_points_in_grid(x, y, label=None):
+def count_points_in_grid(x, y, label=None, bins=100, extent=None, jobs=None):
     # grid = np.zeros((100, 100))
     
     # # Clip values to [0,1] range
@@ -101,7 +107,8 @@ def count_points_in_grid(x, y, label=None):
     fig = plt.figure(figsize=(10, 7))
     ax = fig.add_axes([0.1, 0.1, 0.8, 0.8])
     
-    hist, xedges, yedges = np.histogram2d(x, y, bins=100)
+    # x and y may also be paths to array files, see density_grid
+    hist, xedges, yedges = density_grid(x, y, bins, extent, jobs=jobs)
     
     # Create a mesh grid for plotting
     X, Y = np.meshgrid(xedges[:-1], yedges[:-1])
@@ -119,16 +126,16 @@ def count_points_in_grid(x, y, label=None):
     plt.close()
     # plt.show()
 
-def contour_plot(x, y, label=None):
+def contour_plot(x, y, label=None, grid_size=128, bw_method='scott'):
 
     fig = plt.figure(figsize=(10, 7))
     ax = fig.add_axes([0.1, 0.1, 0.8, 0.8])
 
-    xy = np.vstack([x, y])
-    z = gaussian_kde(xy)(xy)
+    # Density on a regular grid instead of gaussian_kde(xy)(xy) at every point
+    xgrid, ygrid, z = binned_kde(x, y, grid_size, bw_method)
     
     # contour = ax.tricontourf(x, y, np.zeros_like(x), levels=10)
-    contour = ax.tricontourf(x, y, z, levels=10)
+    contour = ax.contourf(xgrid, ygrid, z.T, levels=10)
     
     plt.colorbar(contour, ax=ax, label='Density')
     
@@ -158,14 +165,15 @@ def main():
     # histogram(random_numbers1, label='Uniform')
     histogram(random_numbers2, label='Gaussian')
 
-    file1 = "random_numbers1.bin"
-    file2 = "random_numbers2.bin"
+    # Array containers record dtype and shape, and load as read-only memory maps
+    file1 = "random_numbers1.arr"
+    file2 = "random_numbers2.arr"
     
-    random_numbers1.tofile(file1)
-    random_numbers2.tofile(file2)
+    save_array(file1, random_numbers1)
+    save_array(file2, random_numbers2)
 
-    f_random_numbers1 = np.fromfile(file1, dtype=float)
-    f_random_numbers2 = np.fromfile(file2, dtype=float)
+    f_random_numbers1 = load_array(file1, dtype=float)
+    f_random_numbers2 = load_array(file2, dtype=float)
 
     cumulative_chart(f_random_numbers1, label='Uniform')
     cumulative_chart(f_random_numbers2, label='Gaussian')
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import streaming
+
+
+def _chunks(values, size=1000):
+    return (values[begin:begin + size] for begin in range(0, len(values), size))
+
+
+def test_compute_histogram_streams_a_generator():
+    values = np.random.default_rng(0).normal(size=100000)
+    counts, edges = streaming.compute_histogram(_chunks(values))
+    expected, expected_edges = streaming.compute_histogram(list(_chunks(values)))
+    assert counts.sum() > 0
+    np.testing.assert_array_equal(counts, expected)
+    np.testing.assert_array_equal(edges, expected_edges)
+
+
+def test_rasterize_points_streams_generators():
+    rng = np.random.default_rng(1)
+    x, y = rng.random(50000), rng.random(50000)
+    canvas, extent = streaming.rasterize_points(_chunks(x), _chunks(y), width=64, height=48)
+    expected, expected_extent = streaming.rasterize_points(x, y, width=64, height=48)
+    assert canvas.sum() == len(x)
+    np.testing.assert_array_equal(canvas, expected)
+    assert extent == expected_extent
+
+
+def test_shade_keeps_zero_aggregates_opaque():
+    x = np.array([0.0, 0.0, 1.0])
+    y = np.array([0.0, 0.0, 1.0])
+    values = np.array([-1.0, 1.0, 2.0])
+    canvas, _, counts = streaming.rasterize_points(x, y, values, width=2, height=2, reducer='sum',
+                                              return_counts=True)
+    assert canvas[0, 0] == 0
+    alpha = streaming.shade(canvas, 'linear', counts=counts)[..., 3]
+    np.testing.assert_array_equal(alpha, [[1, 0], [0, 1]])
+
+
+def test_density_grid_streams_generators():
+    rng = np.random.default_rng(2)
+    x, y = rng.normal(size=50000), rng.normal(size=50000)
+    counts, xedges, yedges = streaming.density_grid(_chunks(x), _chunks(y), bins=20)
+    expected, expected_x, expected_y = streaming.density_grid(x, y, bins=20)
+    assert counts.sum() == len(x)
+    np.testing.assert_array_equal(counts, expected)
+    np.testing.assert_array_equal(xedges, expected_x)
+    np.testing.assert_array_equal(yedges, expected_y)
+
+
+def test_density_grid_rejects_a_path_with_an_array():
+    with pytest.raises(ValueError):
+        streaming.density_grid('random_numbers1.arr', np.zeros(10))
+
+
+@pytest.mark.parametrize('sample', ['uniform', 'normal'])
+def test_binned_kde_matches_gaussian_kde(sample):
+    rng = np.random.default_rng(3)
+    x, y = getattr(rng, sample)(size=5000), getattr(rng, sample)(size=5000)
+    assert streaming.kde_relative_error(x, y) < 0.01
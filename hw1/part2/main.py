@@ -1,21 +1,276 @@
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 from matplotlib.patches import Patch
-from pandas.plotting import parallel_coordinates
 
-def bar_plot(data, label=None):
+CACHE_DIR = '.table_cache'
+
+
+def _steps_key(reader, read_kwargs, clean):
+    # Describe how a table is produced, so changing a step invalidates its cache
+    steps = {'reader': reader, 'read_kwargs': read_kwargs}
+    if clean is not None:
+        try:
+            source = inspect.getsource(clean)
+        except (OSError, TypeError):
+            source = ''
+        steps['clean'] = clean.__name__
+        steps['clean_source'] = hashlib.sha1(source.encode()).hexdigest()
+    return steps
+
+
+def _save_columns(data, entry_dir):
+    # One .npy file per column; text columns become fixed-width unicode arrays,
+    # and object columns that mix other types are pickled so they load unchanged
+    columns = []
+    for n, col in enumerate(data.columns):
+        series = data[col]
+        info = {'name': col, 'file': f'col{n}.npy'}
+        if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.to_numpy()
+        elif pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+            values = series.astype(object).to_numpy()
+            info['pickled'] = True
+            info['dtype'] = str(series.dtype)
+        else:
+            missing = series.isna().to_numpy()
+            values = series.astype(object).where(~missing, '').to_numpy().astype(str)
+            if missing.any():
+                info['mask'] = f'col{n}_mask.npy'
+                np.save(os.path.join(entry_dir, info['mask']), missing)
+            info['text'] = True
+            info['dtype'] = str(series.dtype)
+        np.save(os.path.join(entry_dir, info['file']), values, allow_pickle=info.get('pickled', False))
+        columns.append(info)
+    return columns
+
+
+def _load_columns(columns, entry_dir):
+    frame = {}
+    for info in columns:
+        if info.get('pickled'):
+            # Object arrays cannot be memory-mapped
+            values = np.load(os.path.join(entry_dir, info['file']), allow_pickle=True)
+            frame[info['name']] = pd.Series(values, dtype=object).astype(info['dtype'])
+            continue
+        # Copy-on-write mapping: pages are shared until a column is modified
+        values = np.asarray(np.load(os.path.join(entry_dir, info['file']), mmap_mode='c'))
+        if info.get('text'):
+            values = pd.Series(values, dtype=object)
+            if 'mask' in info:
+                values[np.load(os.path.join(entry_dir, info['mask']))] = None
+            values = values.astype(info['dtype'])
+        frame[info['name']] = values
+    return pd.DataFrame(frame, copy=False)
+
+
+def load_table(path, reader='csv', clean=None, cache_dir=None, **read_kwargs):
+    """
+    Load a CSV/Excel table through a columnar cache
+
+    The first load parses the file with pandas, applies `clean` and stores
+    the result as one .npy file per column. Later loads memory-map those
+    columns instead of parsing again. The cache entry is keyed by the source
+    path, size and mtime plus the reader, its keyword arguments (e.g.
+    skiprows) and the source of `clean`, so editing any of them rebuilds it.
+
+    Parameters:
+    path (str): Source file
+    reader (str): 'csv' for pd.read_csv or 'excel' for pd.read_excel
+    clean (function): Optional DataFrame -> DataFrame cleaning step
+    cache_dir (str): Cache location, CACHE_DIR next to the source if None
+    read_kwargs: Passed to the pandas reader
+
+    Returns:
+    DataFrame: The cleaned table
+    """
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR)
+    steps = _steps_key(reader, read_kwargs, clean)
+    key = hashlib.sha1(json.dumps([path, steps], sort_keys=True, default=str).encode()).hexdigest()[:16]
+    entry_dir = os.path.join(cache_dir, f'{os.path.basename(path)}-{key}')
+    meta_path = os.path.join(entry_dir, 'meta.json')
+
+    stat = os.stat(path)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+            return _load_columns(meta['columns'], entry_dir)
+
+    if reader == 'csv':
+        data = pd.read_csv(path, **read_kwargs)
+    elif reader == 'excel':
+        data = pd.read_excel(path, **read_kwargs)
+    else:
+        raise ValueError(f"unknown reader {reader!r}")
+    if clean is not None:
+        data = clean(data)
+
+    os.makedirs(entry_dir, exist_ok=True)
+    meta = {
+        'source': path,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'steps': steps,
+        'columns': _save_columns(data, entry_dir),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+    return data
+
+
+def clean_temperature_data(data):
+    data.columns = ['Year', 'Value']
+    data['Temperature'] = data['Value'].astype(float) * 9/5 + 32 # Convert to Fahrenheit 
+    data['Temperature_Change'] = data['Temperature'].diff() 
+    return data
+
+MAX_BARS = 2000     # bar_plot downsamples longer series to about this many bars
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling
 
-    fig = plt.figure(figsize=(15, 8))
-    bars = plt.bar(data['Year'], data['Temperature'])
+    Keeps the first and last point and, from each of n_out - 2 equal-count
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket.
 
-    for i, bar in enumerate(bars):
-        if i == 0:  # First year has no change to compare to
-            bar.set_color('gray')
-        elif data['Temperature_Change'].iloc[i] > 0:
-            bar.set_color('red')
+    Parameters:
+    x (ndarray): Sorted sample positions
+    y (ndarray): Sample values
+    n_out (int): Number of points to keep
+
+    Returns:
+    ndarray: Sorted indices of the kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (n_out - 2)
+    edges = np.append((np.arange(n_out - 1) * every).astype(int) + 1, n)
+    edges[-2] = n - 1
+
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2]
+        cx = x[next_lo:next_hi].mean()
+        cy = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def min_max_indices(y, n_bins):
+    """
+    Indices of the smallest and largest value in each of n_bins equal-count
+    bins, so the downsampled series keeps the full envelope of the original
+
+    Returns:
+    ndarray: Sorted indices, at most 2 * n_bins of them
+    """
+    n = len(y)
+    if 2 * n_bins >= n:
+        return np.arange(n)
+    size = -(-n // n_bins)
+    n_bins = -(-n // size)
+    binned = np.pad(np.asarray(y), (0, n_bins * size - n), mode='edge').reshape(n_bins, size)
+    offsets = np.arange(n_bins) * size
+    low = np.minimum(binned.argmin(axis=1) + offsets, n - 1)
+    high = np.minimum(binned.argmax(axis=1) + offsets, n - 1)
+    return np.unique(np.concatenate([low, high]))
+
+
+def bar_extents(x, fill=0.8):
+    # Left and right edges of bars centred on sorted x, covering `fill` of
+    # the gap to each neighbour (0.8 matches plt.bar on evenly spaced data)
+    x = np.asarray(x, dtype=float)
+    if len(x) < 2:
+        return x - fill / 2, x + fill / 2
+    gaps = np.diff(x)
+    left = np.append(gaps[:1], gaps) / 2
+    right = np.append(gaps, gaps[-1:]) / 2
+    return x - left * fill, x + right * fill
+
+
+def draw_time_series_bars(ax, x, heights, colors, max_bars=MAX_BARS, method='minmax'):
+    """
+    Draw a bar chart of a long series as one PolyCollection
+
+    Series longer than max_bars are downsampled first. 'minmax' keeps the
+    lowest and highest bar of each of max_bars // 2 bins, so no peak is
+    lost; 'lttb' keeps max_bars bars chosen by lttb_indices. Kept bars are
+    widened to fill the gaps left by the dropped ones.
+
+    Parameters:
+    ax (Axes): Axes to draw on
+    x (array): Sorted bar positions
+    heights (array): Bar heights from a baseline of 0
+    colors (array): One colour per bar, anything to_rgba_array accepts
+    max_bars (int): Most bars to draw, None to draw them all
+    method (str): 'minmax' or 'lttb'
+
+    Returns:
+    PolyCollection: The added collection
+    """
+    x = np.asarray(x, dtype=float)
+    heights = np.asarray(heights, dtype=float)
+    colors = to_rgba_array(colors)
+    if len(colors) == 1:
+        colors = np.repeat(colors, len(x), axis=0)
+
+    fill = 0.8
+    if max_bars is not None and len(x) > max_bars:
+        if method == 'minmax':
+            keep = min_max_indices(heights, max_bars // 2)
+        elif method == 'lttb':
+            keep = lttb_indices(x, heights, max_bars)
         else:
-            bar.set_color('blue')
+            raise ValueError(f"unknown downsampling method {method!r}")
+        x, heights, colors = x[keep], heights[keep], colors[keep]
+        fill = 1.0
+
+    left, right = bar_extents(x, fill)
+    zeros = np.zeros_like(heights)
+    verts = np.stack([np.column_stack(corner) for corner in
+                      ((left, zeros), (left, heights), (right, heights), (right, zeros))], axis=1)
+    bars = PolyCollection(verts, facecolors=colors, edgecolors=colors)
+    bars.sticky_edges.y.append(0)
+    ax.add_collection(bars)
+    ax.autoscale_view()
+    return bars
+
+
+def bar_plot(data, label=None, max_bars=MAX_BARS, downsample='minmax'):
+
+    fig, ax = plt.subplots(figsize=(15, 8))
+
+    # Gray for the first year (no change to compare to), red for increases, blue otherwise
+    change = data['Temperature_Change'].to_numpy()
+    color_index = np.where(change > 0, 1, 2)
+    color_index[:1] = 0
+    colors = to_rgba_array(['gray', 'red', 'blue'])[color_index]
+    draw_time_series_bars(ax, data['Year'], data['Temperature'], colors, max_bars, downsample)
     
     plt.xlabel('Year', fontsize=12)
     plt.ylabel('Degrees F +/- From Average', fontsize=12)
@@ -27,7 +282,7 @@ def bar_plot(data, label=None):
         Patch(facecolor='blue', label='Temperature Decrease from Previous Year'),
         Patch(facecolor='gray', label='First Year (No Change Data)')
     ]
-    plt.legend(handles=legend_elements)
+    plt.legend(handles=legend_elements, loc='upper left')  # 'best' does not look inside collections
     plt.tight_layout()
     plt.savefig('Temparature-change-bar-plot.png')
     plt.close()
@@ -68,51 +323,296 @@ def get_user_cereal_choices(data):
     
     return chosen_cereals
 
-def radar_chart_cereals(data, cereals, stats):
+RADAR_COLORS = ['#FF9999', '#66B2FF', '#99FF99']
 
-    num_vars = len(stats)
-    
-    # Compute angle for each axis
-    angles = [n / float(num_vars) * 2 * np.pi for n in range(num_vars)]
-    angles += angles[:1]  # Complete the circle
-    
 
-    fig, ax = plt.subplots(figsize=(10, 10), subplot_kw=dict(projection='polar'))
-    
-    # Plot data for each cereal
-    colors = ['#FF9999', '#66B2FF', '#99FF99']
-    for idx, cereal in enumerate(cereals):
-        values = data[data['Cereal'] == cereal][stats].values.flatten().tolist()
-        values += values[:1]  # Complete the circle
-        
-        ax.plot(angles, values, 'o-', linewidth=2, label=cereal, color=colors[idx])
-        ax.fill(angles, values, alpha=0.25, color=colors[idx])
-    
-    
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(stats)
-    
-    plt.legend(loc='upper right', bbox_to_anchor=(0.1, 0.1))
-    plt.title("Cereal Nutrition Comparison", pad=20)
-    plt.tight_layout()
-    plt.savefig('cereal-comparison-radar-chart.png')
-    plt.close()
+def index_cereals(data, stats):
+    """
+    Look up the radar chart values of every cereal once
+
+    Parameters:
+    data (DataFrame): The cereal dataset
+    stats (list): Columns shown on the radar chart
+
+    Returns:
+    dict: Cereal name -> float array of its `stats` values
+    """
+    values = data[stats].to_numpy(dtype=float)
+    return dict(zip(data['Cereal'], values))
+
+
+def cereal_combinations(data, size=3, top_n=None, rank_by=None):
+    """
+    Every combination of `size` cereals, for batch radar charts
+
+    Parameters:
+    data (DataFrame): The cereal dataset
+    size (int): Cereals per chart (at most len(RADAR_COLORS))
+    top_n (int): Only combine the first top_n cereals, all if None
+    rank_by (str): Column to sort by (largest first) before taking top_n,
+        table order if None
+
+    Returns:
+    list: Tuples of cereal names
+    """
+    if rank_by is not None:
+        data = data.sort_values(rank_by, ascending=False, kind='stable')
+    names = data['Cereal'].tolist()[:top_n]
+    return list(itertools.combinations(names, size))
+
+
+def radar_chart_path(out_dir, cereals):
+    # File name built from the cereal names, safe on every filesystem
+    slugs = [re.sub(r'[^A-Za-z0-9]+', '-', cereal).strip('-') for cereal in cereals]
+    return os.path.join(out_dir, f"radar_{'__'.join(slugs)}.png")
+
+
+class RadarTemplate:
+    """
+    One polar figure reused for any number of radar charts
+
+    The axes, ticks, title and one line/fill pair per colour are created
+    once; each chart only updates their data, the radial limits and the
+    legend before saving. The figure is not registered with pyplot, so
+    templates can live in worker processes.
+    """
+
+    def __init__(self, stats):
+        angles = np.linspace(0, 2 * np.pi, len(stats), endpoint=False)
+        self.angles = np.append(angles, angles[:1])  # Complete the circle
+
+        self.fig = Figure(figsize=(10, 10))
+        self.ax = self.fig.add_subplot(projection='polar')
+        self.lines = []
+        self.fills = []
+        empty = np.zeros_like(self.angles)
+        for color in RADAR_COLORS:
+            (line,) = self.ax.plot(self.angles, empty, 'o-', linewidth=2, color=color)
+            (fill,) = self.ax.fill(self.angles, empty, alpha=0.25, color=color)
+            self.lines.append(line)
+            self.fills.append(fill)
+
+        self.ax.set_xticks(angles)
+        self.ax.set_xticklabels(stats)
+        self.ax.set_title("Cereal Nutrition Comparison", pad=20)
+
+    def save(self, cereals, values, path):
+        """
+        Draw one comparison and write it to `path`
+
+        Parameters:
+        cereals (list): Up to len(RADAR_COLORS) cereal names
+        values (list): One array of stat values per cereal
+        path (str): Output image file
+        """
+        if len(cereals) > len(self.lines):
+            raise ValueError(f"a radar chart holds at most {len(self.lines)} cereals, got {len(cereals)}")
+        for n, (line, fill) in enumerate(zip(self.lines, self.fills)):
+            shown = n < len(cereals)
+            line.set_visible(shown)
+            fill.set_visible(shown)
+            if shown:
+                closed = np.append(values[n], values[n][:1])
+                line.set_data(self.angles, closed)
+                line.set_label(cereals[n])
+                fill.set_xy(np.column_stack([self.angles, closed]))
+
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view()
+        self.ax.legend(handles=self.lines[:len(cereals)], loc='upper right', bbox_to_anchor=(0.1, 0.1))
+        self.fig.tight_layout()
+        self.fig.savefig(path)
+
+
+def radar_chart_cereals(data, cereals, stats):
+
+    index = index_cereals(data, stats)
+    values = [index[cereal] for cereal in cereals]
+    RadarTemplate(stats).save(cereals, values, 'cereal-comparison-radar-chart.png')
     # plt.show()
 
-def parallel_coordinates_plot(data):
+
+_radar_worker = {}
+
+
+def _init_radar_worker(index, stats, out_dir):
+    _radar_worker['index'] = index
+    _radar_worker['template'] = RadarTemplate(stats)
+    _radar_worker['out_dir'] = out_dir
+
+
+def _render_radar_chart(cereals):
+    index = _radar_worker['index']
+    path = radar_chart_path(_radar_worker['out_dir'], cereals)
+    _radar_worker['template'].save(cereals, [index[cereal] for cereal in cereals], path)
+    return path
+
+
+def radar_chart_batch(data, combinations, stats, out_dir='radar_charts', jobs=None):
+    """
+    Render many radar chart comparisons without prompting
+
+    The table is indexed by cereal name once and every worker process
+    reuses a single RadarTemplate for all charts it draws.
+
+    Parameters:
+    data (DataFrame): The cereal dataset
+    combinations (list): Sequences of cereal names, one chart each
+        (see cereal_combinations)
+    stats (list): Columns shown on the radar charts
+    out_dir (str): Directory for the images, named by radar_chart_path
+    jobs (int): Worker processes, os.cpu_count() if None. 1 renders in
+        this process
+
+    Returns:
+    list: Paths of the written charts, in the order of `combinations`
+    """
+    index = index_cereals(data, stats)
+    combinations = [tuple(cereals) for cereals in combinations]
+    unknown = sorted({cereal for cereals in combinations for cereal in cereals} - index.keys())
+    if unknown:
+        raise ValueError(f"unknown cereals: {', '.join(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(combinations) <= 1:
+        _init_radar_worker(index, stats, out_dir)
+        return [_render_radar_chart(cereals) for cereals in combinations]
+
+    chunksize = max(1, len(combinations) // (jobs * 8))
+    with ProcessPoolExecutor(jobs, initializer=_init_radar_worker,
+                             initargs=(index, stats, out_dir)) as pool:
+        return list(pool.map(_render_radar_chart, combinations, chunksize=chunksize))
+
+
+def read_cereal_combinations(path):
+    # One comparison per line, cereal names separated by commas
+    with open(path) as f:
+        return [[name.strip() for name in line.split(',')] for line in f if line.strip()]
+
+DENSITY_ROWS = 20000    # above this many rows parallel coordinates switch to a density raster
+
+
+def normalize_columns(values):
+    # Min-max normalize every column of a 2D array in one pass; constant columns become 0
+    values = np.asarray(values, dtype=float)
+    low = values.min(axis=0)
+    span = values.max(axis=0) - low
+    return (values - low) / np.where(span > 0, span, 1)
+
+
+def category_colors(categories, colormap):
+    # One RGBA colour per row, spreading the distinct categories over the colormap
+    codes, uniques = pd.factorize(categories)
+    colors = colormap(codes / max(len(uniques) - 1, 1))
+    return colors, codes, uniques
+
+
+def parallel_coordinates_density(normalized, colors=None, height=300, samples=100, chunk_rows=1000000):
+    """
+    Rasterize parallel-coordinate polylines between adjacent axes
+
+    For each gap between axes the rows are first binned by their (start,
+    end) heights, then every occupied bin pair is drawn once, weighted by
+    its count, at `samples` x positions into a (height, samples * (k - 1))
+    raster. The cost is O(rows) plus O(occupied pairs * samples), so it
+    stays bounded however many rows there are. With per-row colours the
+    pixels take the mean colour of the lines crossing them.
+
+    Returns:
+    ndarray: RGBA image, alpha following the log line density
+    """
+    rows, k = normalized.shape
+    width = samples * (k - 1)
+    pairs = height * height
+    counts = np.zeros(height * width)
+    rgb = np.zeros((3, height * width))
+    t = (np.arange(samples) + 0.5) / samples
+
+    for gap in range(k - 1):
+        pair_counts = np.zeros(pairs)
+        pair_rgb = np.zeros((3, pairs))
+        for begin in range(0, rows, chunk_rows):
+            block = normalized[begin:begin + chunk_rows, gap:gap + 2]
+            bins = np.minimum((block * height).astype(np.int64), height - 1)
+            key = bins[:, 0] * height + bins[:, 1]
+            pair_counts += np.bincount(key, minlength=pairs)
+            if colors is not None:
+                for channel in range(3):
+                    pair_rgb[channel] += np.bincount(key, weights=colors[begin:begin + chunk_rows, channel],
+                                                     minlength=pairs)
+
+        occupied = np.flatnonzero(pair_counts)
+        start = (occupied // height + 0.5) / height
+        end = (occupied % height + 0.5) / height
+        y = start[:, None] + t * (end - start)[:, None]
+        row_index = np.minimum((y * height).astype(np.int64), height - 1)
+        pixel = ((height - 1 - row_index) * width + gap * samples + np.arange(samples)).ravel()
+        counts += np.bincount(pixel, weights=np.repeat(pair_counts[occupied], samples),
+                              minlength=height * width)
+        if colors is not None:
+            for channel in range(3):
+                rgb[channel] += np.bincount(pixel, weights=np.repeat(pair_rgb[channel, occupied], samples),
+                                            minlength=height * width)
+
+    image = np.zeros((height * width, 4))
+    filled = counts > 0
+    if colors is not None:
+        image[filled, :3] = (rgb[:, filled] / counts[filled]).T
+    image[:, 3] = np.log1p(counts) / np.log1p(counts.max()) if counts.max() > 0 else 0
+    return image.reshape(height, width, 4)
+
+
+def draw_parallel_coordinates(ax, data, cols, class_column=None, colormap=plt.cm.RdYlBu, density=None,
+                              legend=True):
+    """
+    Parallel coordinates drawn with a single LineCollection
+
+    Parameters:
+    ax (Axes): Axes to draw into
+    data (DataFrame): Table to plot
+    cols (list): Columns to use as axes, normalized together in one pass
+    class_column (str): Optional column used to colour the lines
+    colormap (Colormap): Colormap spread over the classes
+    density (bool): Draw a line-density raster instead of individual lines,
+        by default when there are more than DENSITY_ROWS rows
+    legend (bool): Add a legend entry per class (only for lines mode)
+    """
+    normalized = normalize_columns(data[cols].to_numpy())
+    rows, k = normalized.shape
+    colors = None
+    if class_column is not None:
+        colors, codes, uniques = category_colors(data[class_column], colormap)
+    if density is None:
+        density = rows > DENSITY_ROWS
+
+    if density:
+        ax.imshow(parallel_coordinates_density(normalized, colors), extent=[0, k - 1, 0, 1],
+                  aspect='auto', interpolation='nearest')
+    else:
+        segments = np.stack([np.broadcast_to(np.arange(k), normalized.shape), normalized], axis=-1)
+        ax.add_collection(LineCollection(segments, colors=colors if colors is not None else 'C0'))
+        if legend and class_column is not None:
+            ax.legend(handles=[Line2D([], [], color=colormap(n / max(len(uniques) - 1, 1)), label=name)
+                               for n, name in enumerate(uniques)], loc='upper right')
+
+    for x in range(k):
+        ax.axvline(x, linewidth=1, color='black')
+    ax.set_xticks(range(k))
+    ax.set_xticklabels(cols)
+    ax.set_xlim(0, k - 1)
+    ax.set_ylim(0, 1)
+
+
+def parallel_coordinates_plot(data, density=None):
     # Select columns for visualization
     cols_to_plot = ['avail_seat_km_per_week', 'incidents_85_99', 'fatalities_85_99', 
                     'incidents_00_14', 'fatalities_00_14']
     
-    # Normalize the data for better visualization
-    normalized_data = data.copy()
-    for col in cols_to_plot:
-        normalized_data[col] = (data[col] - data[col].min()) / (data[col].max() - data[col].min())
-
-    normalized_data['Airline'] = data['airline']
-    
+    # Normalization of all axes happens inside draw_parallel_coordinates
     plt.figure(figsize=(15, 8))
-    parallel_coordinates(normalized_data, 'Airline', cols=cols_to_plot, colormap=plt.cm.RdYlBu)
+    draw_parallel_coordinates(plt.gca(), data, cols_to_plot, 'airline', colormap=plt.cm.RdYlBu,
+                              density=density)
     
     plt.title('Airline Safety Metrics Comparison', pad=20)
     plt.xticks(rotation=30)
@@ -150,11 +650,22 @@ def scatter_plot_countries(data):
     # plt.show()
 
 def main():
-
-    data = pd.read_csv('data1.csv', skiprows=4)
-    data.columns = ['Year', 'Value']
-    data['Temperature'] = data['Value'].astype(float) * 9/5 + 32 # Convert to Fahrenheit 
-    data['Temperature_Change'] = data['Temperature'].diff() 
+    parser = argparse.ArgumentParser(description="Plots for the homework 1 part 2 datasets")
+    parser.add_argument('--radar-batch', metavar='FILE',
+                        help="Render the cereal comparisons listed in FILE (one per line, names "
+                             "separated by commas) instead of asking for them")
+    parser.add_argument('--radar-top', type=int, metavar='N',
+                        help="Render every combination of the top N cereals instead of asking")
+    parser.add_argument('--radar-size', type=int, default=3, choices=range(1, len(RADAR_COLORS) + 1),
+                        help="Cereals per chart with --radar-top (default: 3)")
+    parser.add_argument('--radar-rank-by', metavar='COLUMN',
+                        help="Rank cereals by this column for --radar-top (default: table order)")
+    parser.add_argument('--radar-out', default='radar_charts', help="Output directory for batch radar charts")
+    parser.add_argument('-j', '--jobs', type=int, help="Worker processes for batch radar charts")
+    args = parser.parse_args()
+
+    # Parsed and cleaned once, then memory-mapped from .table_cache on later runs
+    data = load_table('data1.csv', skiprows=4, clean=clean_temperature_data)
 
     # Display the summary statistics of the data
     print(data.describe())
@@ -173,32 +684,41 @@ def main():
 
     bar_plot(data, 'NOAA Global Land and Ocean Temperature Anomalies (June)')
 
-    cereal_data = pd.read_excel('data2.xls')
+    cereal_data = load_table('data2.xls', reader='excel')
     
     # Select nutritional stats to compare
     nutritional_stats = ['Calories', 'Protein', 'Fat', 'Sodium', 'Fiber', 
                         'Carbohydrates', 'Sugars', 'Potassium']
     
-    print("Welcome to the Cereal Nutrition Comparison Tool!")
-    
-    while True:
-        user_cereals = get_user_cereal_choices(cereal_data)
+    if args.radar_batch or args.radar_top:
+        # Batch mode: no prompts, every comparison written to args.radar_out
+        if args.radar_batch:
+            combinations = read_cereal_combinations(args.radar_batch)
+        else:
+            combinations = cereal_combinations(cereal_data, args.radar_size, args.radar_top, args.radar_rank_by)
+        paths = radar_chart_batch(cereal_data, combinations, nutritional_stats, args.radar_out, args.jobs)
+        print(f"Wrote {len(paths)} radar charts to {args.radar_out}")
+    else:
+        print("Welcome to the Cereal Nutrition Comparison Tool!")
         
-        radar_chart_cereals(cereal_data, user_cereals, nutritional_stats)
+        while True:
+            user_cereals = get_user_cereal_choices(cereal_data)
+            
+            radar_chart_cereals(cereal_data, user_cereals, nutritional_stats)
+            
+            again = input("\nWould you like to compare different cereals? (yes/no): ").lower()
+            if again != 'yes':
+                break
         
-        again = input("\nWould you like to compare different cereals? (yes/no): ").lower()
-        if again != 'yes':
-            break
-    
-    print("Thank you for using the Cereal Nutrition Comparison Tool!")
+        print("Thank you for using the Cereal Nutrition Comparison Tool!")
 
     print("\nAnalyzing Airline Safety Data:")
-    airline_data = pd.read_csv('data3.csv')
+    airline_data = load_table('data3.csv')
     print(airline_data.describe())
     parallel_coordinates_plot(airline_data)
 
     print("\nAnalyzing Cousin Marriage Percentage Data:")
-    country_data = pd.read_csv('data4.csv')
+    country_data = load_table('data4.csv')
     print(country_data.describe())
     scatter_plot_countries(country_data)
 
@@ -1,17 +1,215 @@
+import os
+from functools import lru_cache
+
 import nibabel as nib
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.image import imsave
 import numpy as np
 
+SLICE_AXES = {'sagittal': 0, 'coronal': 1, 'axial': 2}
+LUT_SIZE = 256
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.zst')
+
+
+def read_slice(img, axis, index, volume=0, dtype=None):
+    """
+    Read a single 2D slice without loading the rest of the image
+
+    Parameters:
+    img (Nifti1Image or ndarray): Image to slice. For a nibabel image only the
+        requested slice is read through its array proxy (img.dataobj)
+    axis (int): Spatial axis to slice along (0 sagittal, 1 coronal, 2 axial)
+    index (int): Slice position along that axis
+    volume (int): Volume index for 4D images, ignored for 3D ones
+    dtype (dtype): Convert the slice to this dtype, e.g. np.float32.
+        By default the on-disk dtype is kept (nibabel still applies any
+        scl_slope/scl_inter scaling, which can promote it to float)
+
+    Returns:
+    ndarray: The 2D slice
+    """
+    data = getattr(img, 'dataobj', img)
+    slicer = [slice(None)] * len(data.shape)
+    slicer[axis] = index
+    if len(data.shape) > 3:
+        slicer[3] = volume
+        slicer[4:] = [0] * (len(data.shape) - 4)
+    slice_data = np.asarray(data[tuple(slicer)])
+    if dtype is not None:
+        slice_data = slice_data.astype(dtype, copy=False)
+    return slice_data
+
+
+def middle_slices(img, volume=0, dtype=None):
+    # Sagittal, coronal and axial slices through the centre of the image
+    shape = getattr(img, 'dataobj', img).shape
+    return {name: read_slice(img, axis, shape[axis] // 2, volume, dtype)
+            for name, axis in SLICE_AXES.items()}
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(cmap):
+    # 256-entry uint8 RGB table for a matplotlib colormap name
+    colors = matplotlib.colormaps[cmap](np.linspace(0, 1, LUT_SIZE))[:, :3]
+    return np.round(colors * 255).astype(np.uint8)
+
+
+def slice_source(img, volume=0):
+    """
+    Something to read many slices of one volume from cheaply
+
+    Slicing the proxy of a compressed file (.nii.gz) decompresses the
+    stream from the start on every read, so reading all slices that way
+    costs quadratic time. For such files the volume is decompressed into
+    memory once, with the on-disk dtype. Uncompressed, unscaled files are
+    memory-mapped, since the proxy reads a sagittal slice in many small
+    pieces. Anything else is returned as it is.
+
+    Returns:
+    Nifti1Image or ndarray: Pass to read_slice with the same volume index
+    """
+    filename = img.get_filename() if hasattr(img, 'get_filename') else None
+    if not filename:
+        return img
+    data = img.dataobj
+    if not filename.endswith(COMPRESSED_SUFFIXES):
+        if getattr(data, 'slope', 1) == 1 and getattr(data, 'inter', 0) == 0:
+            unscaled = data.get_unscaled()
+            if isinstance(unscaled, np.memmap):
+                return unscaled
+        return img
+    index = (slice(None),) * 3
+    if len(data.shape) > 3:
+        index += (volume,) + (0,) * (len(data.shape) - 4)
+    return np.asarray(data[index])
+
+
+def volume_range(img, volume=0):
+    # Min and max of a volume, streamed one axial slice at a time unless it is in memory
+    img = slice_source(img, volume)
+    if isinstance(img, np.ndarray):
+        data = img if img.ndim == 3 else read_slice(img, 2, slice(None), volume)
+        return float(data.min()), float(data.max())
+    shape = img.dataobj.shape
+    vmin, vmax = np.inf, -np.inf
+    for index in range(shape[2]):
+        slice_data = read_slice(img, 2, index, volume)
+        vmin = min(vmin, slice_data.min())
+        vmax = max(vmax, slice_data.max())
+    return float(vmin), float(vmax)
+
+
+def slice_to_indices(slice_data, vmin=None, vmax=None):
+    """
+    Normalize a slice once into uint8 colormap indices
+
+    The slice is transposed to match the orientation used by
+    visualize_brain_slices. vmin/vmax default to the slice's own range.
+    """
+    slice_data = np.asarray(slice_data, dtype=np.float32).T
+    if vmin is None:
+        vmin = float(slice_data.min())
+    if vmax is None:
+        vmax = float(slice_data.max())
+    scale = (LUT_SIZE - 1) / (vmax - vmin) if vmax > vmin else 0.0
+    indices = (slice_data - vmin) * scale
+    np.clip(indices, 0, LUT_SIZE - 1, out=indices)
+    return indices.astype(np.uint8)
+
+
+def write_slice_png(slice_data, path, cmap='gray', vmin=None, vmax=None):
+    # Colour a slice with a single LUT lookup and write it without a figure
+    imsave(path, colormap_lut(cmap)[slice_to_indices(slice_data, vmin, vmax)])
+
+
+def montage(tiles, columns=None):
+    """
+    Arrange equally sized 2D index images into a grid, row by row
+
+    Parameters:
+    tiles (list): 2D uint8 arrays of the same shape
+    columns (int): Tiles per row, a roughly square grid if None.
+        Use len(tiles) for a single strip
+
+    Returns:
+    ndarray: The combined 2D image, unused cells are left at 0
+    """
+    if columns is None:
+        columns = int(np.ceil(np.sqrt(len(tiles))))
+    rows = -(-len(tiles) // columns)
+    height, width = tiles[0].shape
+    canvas = np.zeros((rows * height, columns * width), dtype=tiles[0].dtype)
+    for n, tile in enumerate(tiles):
+        row, col = divmod(n, columns)
+        canvas[row * height:(row + 1) * height, col * width:(col + 1) * width] = tile
+    return canvas
+
+
+def export_all_slices(img, out_dir, cmap='gray', axes=None, layout='files', columns=None, volume=0):
+    """
+    Write every slice along the given axes as PNGs for quick QA
+
+    Slices are read one at a time through read_slice (from a single
+    decompressed copy for compressed files, see slice_source) and share the
+    volume's intensity range, so they are directly comparable.
+
+    Parameters:
+    img (Nifti1Image or ndarray): Image to export
+    out_dir (str): Output directory
+    cmap (str): Matplotlib colormap name
+    axes (list): Names from SLICE_AXES, all three if None
+    layout (str): 'files' for one PNG per slice, 'strip' for one row per
+        axis or 'montage' for a grid per axis
+    columns (int): Grid width for 'montage', roughly square if None
+    volume (int): Volume index for 4D images
+
+    Returns:
+    list: Paths of the written files
+    """
+    if layout not in ('files', 'strip', 'montage'):
+        raise ValueError(f"unknown layout {layout!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    img = slice_source(img, volume)
+    shape = getattr(img, 'dataobj', img).shape
+    vmin, vmax = volume_range(img, volume)
+    lut = colormap_lut(cmap)
+
+    written = []
+    for name in axes or SLICE_AXES:
+        axis = SLICE_AXES[name]
+        tiles = []
+        for index in range(shape[axis]):
+            indices = slice_to_indices(read_slice(img, axis, index, volume), vmin, vmax)
+            if layout == 'files':
+                path = os.path.join(out_dir, f'{name}_{index:04d}_{cmap}.png')
+                imsave(path, lut[indices])
+                written.append(path)
+            else:
+                tiles.append(indices)
+        if tiles:
+            path = os.path.join(out_dir, f'{name}_{layout}_{cmap}.png')
+            imsave(path, lut[montage(tiles, len(tiles) if layout == 'strip' else columns)])
+            written.append(path)
+    return written
+
+
+def write_brain_slices(img, colormaps=['gray', 'viridis']):
+    # Figure-free counterpart of visualize_brain_slices: one PNG per view and colormap
+    slices = middle_slices(img)
+    for cmap in colormaps:
+        for name, slice_data in slices.items():
+            write_slice_png(slice_data, f'brain_slices_{name}_{cmap}.png', cmap)
+
+
 def visualize_brain_slices(data, colormaps=['gray', 'viridis']):
    
-    # Get middle slices from each axis
-    x_middle = data.shape[0] // 2
-    y_middle = data.shape[1] // 2
-    z_middle = data.shape[2] // 2
-    
-    sagittal_slice = data[x_middle, :, :]
-    coronal_slice = data[:, y_middle, :]
-    axial_slice = data[:, :, z_middle]
+    # Get middle slices from each axis, reading only those slices when
+    # `data` is a nibabel image
+    slices = middle_slices(data)
+    sagittal_slice = slices['sagittal']
+    coronal_slice = slices['coronal']
+    axial_slice = slices['axial']
     
     # Create figure with two rows (one for each colormap)
     for cmap in colormaps:
@@ -39,10 +237,10 @@ def visualize_brain_slices(data, colormaps=['gray', 'viridis']):
 def main():
     filepath = 'T2.nii.gz'
 
+    # nib.load only reads the header; voxel data stays on disk until sliced
     img = nib.load(filepath)
-    data = img.get_fdata()
 
-    visualize_brain_slices(data)
+    visualize_brain_slices(img)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as anim
 
+from arrayfile import load_array
+from marching_squares import draw_segments, marching_squares_levels, stitch_segments
+
 # Draws the starting plot. Don't change this code
 def draw_initial_plot(data, x, y):
 
@@ -30,37 +33,24 @@ def draw_initial_plot(data, x, y):
 
 
 # Load data and make range arrays for looping
-data = np.load("hw2/scalars_2D.npy") # access scalar values by data[i,j]
+data = load_array("hw2/scalars_2D.npy") # access scalar values by data[i,j]
 x = np.arange(0,data.shape[0])
 y = np.arange(0,data.shape[1])
 
 fig, ax = draw_initial_plot(data, x, y)
 
 
-# Draws a dot at a given point
-# point - type of tuple or array with length 2: (x,y) or [x,y]
-# color - string of color to draw dot - Ex: ""red", "green", "blue"
-def draw_dot(point, color):
-    ax.scatter(point[0], point[1], color=color)
-
-# Draws a line from point0 to point1
-# point0 - type of tuple or array with length 2: (x,y) or [x,y]
-# point1 - type of tuple or array with length 2: (x,y) or [x,y]
-def draw_line(point0, point1):
-    x = [point0[0], point1[0]]
-    y = [point0[1], point1[1]]
-    ax.plot(x, y, color="black")
-
-
-
 #-----------------------
 # ASSIGNMENT STARTS HERE
 #-----------------------
 parser = argparse.ArgumentParser(description='Marching Squares Algorithm')
 parser.add_argument('--li', action='store_true', help='Use linear interpolation instead of midpoint method')
+parser.add_argument('--stitch', action='store_true', help='Join the segments into polylines and print their topology')
+parser.add_argument('--isovalues', type=float, nargs='+', default=[50],
+                    help='Isovalues to draw isolines for, the grid points are coloured by the first')
 args = parser.parse_args()
 
-isovalue = 50
+isovalue = args.isovalues[0]
 # linear_interpolation = False # else, midpoint method
 linear_interpolation = args.li
 
@@ -69,117 +59,28 @@ ax.scatter([], [], color='black', label='below')  # Empty black dot for legend
 ax.scatter([], [], color='red', label='above')    # Empty red dot for legend
 ax.legend(loc='upper left', bbox_to_anchor=(1, 1))  # Place legend outside the plot
 
-for i in x:
-    for j in y:
-        # TODO Part 1
-        if data[i, j] >= isovalue:
-            draw_dot((i, j), "red")
-        else:
-            draw_dot((i, j), "black")
-        continue
-
-
-# Draw Lines in Marching Squares - Midpoint
-def march_sq_midpoint(data, i, j, isovalue):
-    # TODO Part 2
-    v0 = data[i, j]       # Bottom left
-    v1 = data[i+1, j]     # Bottom right
-    v2 = data[i+1, j+1]   # Top right
-    v3 = data[i, j+1]     # Top left
-    
-    # case number by comparing each vertex to isovalue
-    case = 0
-    if v0 >= isovalue: case |= 1    # Bottom left
-    if v1 >= isovalue: case |= 2    # Bottom right
-    if v2 >= isovalue: case |= 4    # Top right
-    if v3 >= isovalue: case |= 8    # Top left
-    
-    # Calculate midpoints of cell edges
-    bottom = [i + 0.5, j]      # Bottom edge midpoint
-    right = [i + 1, j + 0.5]   # Right edge midpoint
-    top = [i + 0.5, j + 1]     # Top edge midpoint
-    left = [i, j + 0.5]        # Left edge midpoint
-    
-    # Draw appropriate lines based on case number
-    if case == 1 or case == 14:
-        draw_line(bottom, left)
-    elif case == 2 or case == 13:
-        draw_line(bottom, right)
-    elif case == 3 or case == 12:
-        draw_line(left, right)
-    elif case == 4 or case == 11:
-        draw_line(right, top)
-    elif case == 5:
-        draw_line(bottom, right)
-        draw_line(left, top)
-    elif case == 6 or case == 9:
-        draw_line(bottom, top)
-    elif case == 7 or case == 8:
-        draw_line(left, top)
-    elif case == 10:
-        draw_line(left, bottom)
-        draw_line(right, top)
+# TODO Part 1
+# One scatter call for the whole grid, red at or above the isovalue
+grid_i, grid_j = np.meshgrid(x, y, indexing='ij')
+ax.scatter(grid_i.ravel(), grid_j.ravel(), color=np.where(np.ravel(data) >= isovalue, "red", "black"))
+
+
+# TODO Part 2 (midpoint) and Part 3 (--li, linear interpolation)
+# Marching squares over the whole grid at once, one LineCollection per isovalue
+levels = marching_squares_levels(data, args.isovalues, interpolate=linear_interpolation, return_edges=args.stitch)
+colors = ["black"] if len(args.isovalues) == 1 else plt.cm.viridis(np.linspace(0, 1, len(args.isovalues)))
+for level, result, color in zip(args.isovalues, levels, colors):
+    if args.stitch:
+        polylines = stitch_segments(*result)
+        for n, line in enumerate(polylines):
+            if line.closed:
+                print(f"isovalue {level:g} contour {n}: closed, {len(line.points)} points, "
+                      f"{line.orientation}, area {line.area:.3f}")
+            else:
+                print(f"isovalue {level:g} contour {n}: open, {len(line.points)} points")
+        draw_segments(ax, [np.vstack([line.points, line.points[:1]]) if line.closed else line.points
+                           for line in polylines], color)
     else:
-        return
-    # # Cases 0 and 15 have no lines
-    # return
-
-# Draw Lines in Marching Squares - Linear Interpolation
-def march_sq_lin_interp(data, i, j, isovalue):
-    # TODO Part 3
-    v0 = data[i, j]       # Bottom left
-    v1 = data[i+1, j]     # Bottom right
-    v2 = data[i+1, j+1]   # Top right
-    v3 = data[i, j+1]     # Top left
-
-    case = 0
-    if v0 >= isovalue: case |= 1    # Bottom left
-    if v1 >= isovalue: case |= 2    # Bottom right
-    if v2 >= isovalue: case |= 4    # Top right
-    if v3 >= isovalue: case |= 8    # Top left
-
-    def interpolate(v1, v2, p1, p2):
-        if abs(v1 - v2) < 1e-10:     # devison by zero
-            return p1
-        t = (isovalue - v1) / (v2 - v1)
-        return[p1[0] + t * (p2[0] - p1[0]), p1[1] + t * (p2[1] - p1[1])]
-    
-    # interpolated points of cell edges
-    bottom = interpolate(v0, v1, [i, j], [i+1, j])     # Bottom edge point
-    right = interpolate(v1, v2, [i+1, j], [i+1, j+1])  # Right edge point
-    top = interpolate(v2, v3, [i+1, j+1], [i, j+1])    # Top edge point
-    left = interpolate(v3, v0, [i, j+1], [i, j])       # Left edge point
-
-    # appropriate lines based on case number
-    if case == 1 or case == 14:
-        draw_line(bottom, left)
-    elif case == 2 or case == 13:
-        draw_line(bottom, right)
-    elif case == 3 or case == 12:
-        draw_line(left, right)
-    elif case == 4 or case == 11:
-        draw_line(right, top)
-    elif case == 5:
-        draw_line(bottom, right)
-        draw_line(left, top)
-    elif case == 6 or case == 9:
-        draw_line(bottom, top)
-    elif case == 7 or case == 8:
-        draw_line(left, top)
-    elif case == 10:
-        draw_line(left, bottom)
-        draw_line(right, top)
-    else:
-        return
-
-
-# Implement simple marching squares with midpoint approach
-for i in x[0:-1]:
-    for j in y[0:-1]:
-        if (linear_interpolation):
-            march_sq_lin_interp(data, i, j, isovalue)
-        else:
-            march_sq_midpoint(data, i, j, isovalue)
-
+        draw_segments(ax, result, color)
 
 plt.show()
\ No newline at end of file
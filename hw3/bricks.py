@@ -0,0 +1,275 @@
+import json
+import os
+
+import numpy as np
+
+from arrayfile import load_array
+
+INDEX_NAME = 'index.json'
+BRICK_SIZE = 64
+HIST_BINS = 32
+VALUE_RANGE = (0, 4096)     # 12-bit voxels after read_dat_and_convert_to_raw
+
+
+# Halve a (z, y, x) block along every axis by averaging 2x2x2 voxels.
+# Odd sizes are padded by repeating the last slice/row/column.
+def downsample(block):
+    pad = [(0, size % 2) for size in block.shape]
+    if any(after for _, after in pad):
+        block = np.pad(block, pad, mode='edge')
+    z, y, x = block.shape
+    summed = block.reshape(z // 2, 2, y // 2, 2, x // 2, 2).sum(axis=(1, 3, 5), dtype=np.uint32)
+    return ((summed + 4) // 8).astype(block.dtype)
+
+
+class _LevelWriter:
+    """
+    Receives z-slices of one pyramid level, cuts them into bricks and feeds
+    a 2x downsampled copy of the slices to the next level
+
+    Only `brick_size` slices of the level (plus one carried slice for the
+    downsampling) are held in memory at a time.
+    """
+
+    def __init__(self, level, shape, brick_size, out_dir, hist_bins, value_range, next_writer):
+        self.level = level
+        self.shape = shape
+        self.brick_size = brick_size
+        self.grid = tuple(-(-size // brick_size) for size in shape)
+        self.hist_bins = hist_bins
+        self.value_range = value_range
+        self.next_writer = next_writer
+        self.file_name = f'level{level}.raw'
+        self.file = open(os.path.join(out_dir, self.file_name), 'wb')
+
+        n_bricks = self.grid[0] * self.grid[1] * self.grid[2]
+        self.min = np.zeros(n_bricks, dtype=np.uint16)
+        self.max = np.zeros(n_bricks, dtype=np.uint16)
+        self.hist = np.zeros((n_bricks, hist_bins), dtype=np.uint32)
+        self.pending = []
+        self.pending_slices = 0
+        self.carry = None
+        self.brick_row = 0
+
+    def push(self, slices):
+        if self.next_writer is not None:
+            if self.carry is not None:
+                slices_for_next = np.concatenate([self.carry, slices])
+            else:
+                slices_for_next = slices
+            even = slices_for_next.shape[0] // 2 * 2
+            if even:
+                self.next_writer.push(downsample(slices_for_next[:even]))
+            self.carry = slices_for_next[even:] if even < slices_for_next.shape[0] else None
+
+        self.pending.append(slices)
+        self.pending_slices += slices.shape[0]
+        while self.pending_slices >= self.brick_size:
+            stacked = np.concatenate(self.pending)
+            self._write_row(stacked[:self.brick_size])
+            rest = stacked[self.brick_size:]
+            self.pending = [rest] if rest.shape[0] else []
+            self.pending_slices = rest.shape[0]
+
+    def finish(self):
+        if self.pending_slices:
+            self._write_row(np.concatenate(self.pending))
+            self.pending = []
+            self.pending_slices = 0
+        self.file.close()
+        if self.next_writer is not None:
+            if self.carry is not None:
+                self.next_writer.push(downsample(self.carry))
+            self.next_writer.finish()
+
+    def _write_row(self, slab):
+        # Pad the slab to whole bricks by repeating the edge so the padding
+        # never changes a brick's min/max, then write bricks in (y, x) order
+        b = self.brick_size
+        nz, ny, nx = slab.shape
+        _, grid_y, grid_x = self.grid
+        padded = np.pad(slab, [(0, b - nz), (0, grid_y * b - ny), (0, grid_x * b - nx)], mode='edge')
+        bricks = padded.reshape(b, grid_y, b, grid_x, b).transpose(1, 3, 0, 2, 4)
+        bricks = np.ascontiguousarray(bricks).reshape(grid_y * grid_x, b, b, b)
+        bricks.tofile(self.file)
+
+        first = self.brick_row * grid_y * grid_x
+        ids = slice(first, first + grid_y * grid_x)
+        self.min[ids] = bricks.min(axis=(1, 2, 3))
+        self.max[ids] = bricks.max(axis=(1, 2, 3))
+        lo, hi = self.value_range
+        for by in range(grid_y):
+            for bx in range(grid_x):
+                valid = slab[:, by * b:(by + 1) * b, bx * b:(bx + 1) * b]
+                self.hist[first + by * grid_x + bx] = np.histogram(
+                    np.clip(valid, lo, hi - 1), bins=self.hist_bins, range=(lo, hi))[0]
+        self.brick_row += 1
+
+    def describe(self, out_dir):
+        index_file = f'level{self.level}_index.npz'
+        np.savez(os.path.join(out_dir, index_file), min=self.min, max=self.max, hist=self.hist)
+        return {
+            'level': self.level,
+            'shape': list(self.shape),
+            'grid': list(self.grid),
+            'file': self.file_name,
+            'index': index_file,
+        }
+
+
+def write_bricked_pyramid(raw_file_path, shape, out_dir, brick_size=BRICK_SIZE, levels=None,
+                          hist_bins=HIST_BINS, value_range=VALUE_RANGE, dtype='<u2'):
+    """
+    Write a multi-resolution bricked copy of a flat .raw volume
+
+    Each level is half the size of the previous one (2x2x2 averaging) and is
+    stored as fixed-size bricks of brick_size^3 voxels in z, y, x brick order.
+    Every level gets a per-brick min/max/histogram index so readers can skip
+    bricks outside a region of interest or an isovalue range.
+
+    Parameters:
+    raw_file_path (str): Volume written by read_dat_and_convert_to_raw (.raw or array container)
+    shape (tuple): Volume dimensions in NumPy (z, y, x) order
+    out_dir (str): Directory to create for the pyramid
+    brick_size (int): Edge length of a brick in voxels, must be even
+    levels (int): Number of levels, by default enough to fit in one brick
+    hist_bins (int): Number of histogram bins per brick over `value_range`
+    value_range (tuple): (low, high) range covered by the histograms
+    dtype (str): Voxel dtype of the .raw file
+
+    Returns:
+    dict: The pyramid index that was written to INDEX_NAME
+    """
+    if brick_size % 2:
+        raise ValueError(f"brick_size must be even, got {brick_size}")
+    shape = tuple(int(size) for size in shape)
+    if levels is None:
+        levels = 1
+        level_shape = shape
+        while max(level_shape) > brick_size:
+            level_shape = tuple(-(-size // 2) for size in level_shape)
+            levels += 1
+
+    level_shapes = [shape]
+    for _ in range(levels - 1):
+        level_shapes.append(tuple(-(-size // 2) for size in level_shapes[-1]))
+
+    os.makedirs(out_dir, exist_ok=True)
+    writers = []
+    next_writer = None
+    for level in reversed(range(levels)):
+        next_writer = _LevelWriter(level, level_shapes[level], brick_size, out_dir,
+                                   hist_bins, value_range, next_writer)
+        writers.append(next_writer)
+    writers.reverse()
+
+    volume = load_array(raw_file_path, dtype, shape)
+    for begin in range(0, shape[0], brick_size):
+        writers[0].push(np.array(volume[begin:begin + brick_size]))
+    writers[0].finish()
+    del volume
+
+    index = {
+        'shape': list(shape),
+        'dtype': np.dtype(dtype).str,
+        'brick_size': brick_size,
+        'hist_bins': hist_bins,
+        'value_range': list(value_range),
+        'levels': [writer.describe(out_dir) for writer in writers],
+    }
+    with open(os.path.join(out_dir, INDEX_NAME), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+class BrickedVolume:
+    """
+    Read access to a pyramid written by write_bricked_pyramid
+
+    Brick files are memory-mapped, so only the bricks a query touches are
+    ever read from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_NAME)) as f:
+            self.index = json.load(f)
+        self.brick_size = self.index['brick_size']
+        self.dtype = np.dtype(self.index['dtype'])
+        self.levels = self.index['levels']
+        self._bricks = {}
+        self._stats = {}
+
+    def shape(self, level=0):
+        return tuple(self.levels[level]['shape'])
+
+    def grid(self, level=0):
+        return tuple(self.levels[level]['grid'])
+
+    def bricks(self, level=0):
+        # (n_bricks, b, b, b) view of a level's brick file
+        if level not in self._bricks:
+            b = self.brick_size
+            info = self.levels[level]
+            n_bricks = int(np.prod(info['grid']))
+            self._bricks[level] = np.memmap(os.path.join(self.path, info['file']),
+                                            dtype=self.dtype, mode='r', shape=(n_bricks, b, b, b))
+        return self._bricks[level]
+
+    def stats(self, level=0):
+        # Per-brick 'min', 'max' and 'hist' arrays
+        if level not in self._stats:
+            with np.load(os.path.join(self.path, self.levels[level]['index'])) as npz:
+                self._stats[level] = {key: npz[key] for key in npz.files}
+        return self._stats[level]
+
+    def brick_id(self, bz, by, bx, level=0):
+        _, grid_y, grid_x = self.grid(level)
+        return (bz * grid_y + by) * grid_x + bx
+
+    def brick_origin(self, brick_id, level=0):
+        # Voxel (z, y, x) of a brick's first voxel
+        _, grid_y, grid_x = self.grid(level)
+        bz, rest = divmod(int(brick_id), grid_y * grid_x)
+        by, bx = divmod(rest, grid_x)
+        return bz * self.brick_size, by * self.brick_size, bx * self.brick_size
+
+    def bricks_in_range(self, low, high, level=0):
+        # Ids of bricks holding at least one value in [low, high]
+        stats = self.stats(level)
+        return np.flatnonzero((stats['max'] >= low) & (stats['min'] <= high))
+
+    def bricks_for_isovalue(self, isovalue, level=0):
+        # Ids of bricks an isosurface at `isovalue` can pass through
+        return self.bricks_in_range(isovalue, isovalue, level)
+
+    def bricks_for_roi(self, roi, level=0):
+        # Ids of bricks overlapping roi = ((z0, z1), (y0, y1), (x0, x1)), end exclusive
+        b = self.brick_size
+        ranges = [np.arange(lo // b, -(-hi // b)) for lo, hi in roi]
+        bz, by, bx = np.meshgrid(*ranges, indexing='ij')
+        return self.brick_id(bz, by, bx, level).ravel()
+
+    def read_roi(self, roi, level=0):
+        """
+        Assemble the voxels of roi = ((z0, z1), (y0, y1), (x0, x1)) at a
+        level, reading only the bricks that overlap it
+        """
+        roi = [(max(0, lo), min(hi, size)) for (lo, hi), size in zip(roi, self.shape(level))]
+        out = np.empty([hi - lo for lo, hi in roi], dtype=self.dtype)
+        bricks = self.bricks(level)
+        b = self.brick_size
+        for brick_id in self.bricks_for_roi(roi, level):
+            origin = self.brick_origin(brick_id, level)
+            src = []
+            dst = []
+            for (lo, hi), start in zip(roi, origin):
+                first, last = max(lo, start), min(hi, start + b)
+                src.append(slice(first - start, last - start))
+                dst.append(slice(first - lo, last - lo))
+            out[tuple(dst)] = bricks[brick_id][tuple(src)]
+        return out
+
+    def read_level(self, level):
+        # A whole (usually coarse) level as one flat array
+        return self.read_roi([(0, size) for size in self.shape(level)], level)
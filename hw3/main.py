@@ -1,36 +1,338 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
 import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from arrayfile import ARRAY_SUFFIX, is_array_file, load_array, write_array_chunks
+from bricks import BRICK_SIZE, INDEX_NAME, write_bricked_pyramid
+
+HEADER_FORMAT = '<3H'                          # x, y, z sizes, little endian
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)   # 6 bytes
+VOXEL_DTYPE = np.dtype('<u2')                  # 16-bit voxels, only 12 bits used
+VOXEL_MASK = 0xFFF
+CHUNK_VOXELS = 1 << 24                         # 16M voxels (32 MB) per chunk
+MANIFEST_NAME = '.raw_manifest.json'
+HASH_BLOCK_SIZE = 1 << 23                      # 8 MB reads when hashing
+
+
+def read_dat_header(dat_file_path):
+    """
+    Read and validate the header of a .dat volume
+
+    Parameters:
+    dat_file_path (str): Path to the .dat file
+
+    Returns:
+    tuple: (x_size, y_size, z_size)
+
+    Raises:
+    ValueError: If the file is shorter than the header or its payload size
+    does not match the dimensions stored in the header
+    """
+    file_size = os.path.getsize(dat_file_path)
+    if file_size < HEADER_SIZE:
+        raise ValueError(f"{dat_file_path}: file is {file_size} bytes, "
+                         f"shorter than the {HEADER_SIZE}-byte header")
 
-def read_dat_and_convert_to_raw(dat_file_path, raw_file_path):
-    # Open the .dat file to read binary data
     with open(dat_file_path, 'rb') as dat_file:
-        # Read the header
-        header = dat_file.read(6)
-        x_size, y_size, z_size = struct.unpack('<3H', header)  # Assuming little endian
-
-        # Prepare to read the actual data
-        num_voxels = x_size * y_size * z_size
-        raw_data = bytearray()
-
-        # Read each 16-bit slice-wise value, noting that only 12 bits are used
-        for _ in range(num_voxels):
-            # Read 2 bytes (16 bits)
-            data_bytes = dat_file.read(2)
-            # Convert to 16-bit short, assuming little endian
-            data_value = struct.unpack('<H', data_bytes)[0]
-            # Mask the lower 12 bits since only those are used
-            data_value &= 0xFFF
-            # Re-pack as unsigned short (16 bits) and add to raw_data
-            raw_data.extend(struct.pack('<H', data_value))
-
-        # Write the processed data to the RAW file
+        x_size, y_size, z_size = struct.unpack(HEADER_FORMAT, dat_file.read(HEADER_SIZE))
+
+    expected = HEADER_SIZE + x_size * y_size * z_size * VOXEL_DTYPE.itemsize
+    if file_size != expected:
+        raise ValueError(f"{dat_file_path}: header says {x_size}x{y_size}x{z_size} "
+                         f"({expected} bytes with header) but file is {file_size} bytes")
+
+    return x_size, y_size, z_size
+
+
+def read_dat_and_convert_to_raw(dat_file_path, raw_file_path=None, in_place=False,
+                                chunk_voxels=CHUNK_VOXELS, verbose=True):
+    """
+    Convert a .dat volume (6-byte '<3H' header followed by 16-bit voxels) to a
+    headerless .raw file with every voxel masked to its lower 12 bits. An
+    output path ending in ARRAY_SUFFIX ('.arr') is written as an array
+    container instead, recording the (z, y, x) shape and dtype
+
+    The voxels are memory-mapped and processed in chunks of `chunk_voxels`,
+    so memory use stays bounded regardless of the volume size.
+
+    Parameters:
+    dat_file_path (str): Path to the input .dat file
+    raw_file_path (str): Path to the output .raw file. With `in_place` it may
+        be None, in which case the converted data stays at `dat_file_path`
+    in_place (bool): Rewrite the input file instead of writing a second copy.
+        The payload is shifted over the header, the file is truncated and then
+        renamed to `raw_file_path` if one is given
+    chunk_voxels (int): Number of voxels masked and written per step
+    verbose (bool): Print the throughput when done
+
+    Returns:
+    tuple: (x_size, y_size, z_size) of the converted volume
+    """
+    if raw_file_path is None and not in_place:
+        raise ValueError("raw_file_path is required unless in_place is set")
+    container = raw_file_path is not None and raw_file_path.endswith(ARRAY_SUFFIX)
+    if container and in_place:
+        raise ValueError("in_place conversion cannot write an array container")
+
+    x_size, y_size, z_size = read_dat_header(dat_file_path)
+    num_voxels = x_size * y_size * z_size
+    chunk_voxels = max(1, int(chunk_voxels))
+
+    start = time.perf_counter()
+    if container:
+        data = np.memmap(dat_file_path, dtype=VOXEL_DTYPE, mode='r', offset=HEADER_SIZE,
+                         shape=(num_voxels,)) if num_voxels else np.empty(0, VOXEL_DTYPE)
+        chunks = (data[begin:begin + chunk_voxels] & VOXEL_MASK
+                  for begin in range(0, num_voxels, chunk_voxels))
+        write_array_chunks(raw_file_path, chunks, VOXEL_DTYPE, (z_size, y_size, x_size))
+        del data
+    elif num_voxels == 0:
+        # np.memmap refuses empty mappings; the output is simply empty
+        if in_place:
+            os.truncate(dat_file_path, 0)
+        else:
+            open(raw_file_path, 'wb').close()
+    elif in_place:
+        data = np.memmap(dat_file_path, dtype=VOXEL_DTYPE, mode='r+')
+        # Header is 3 voxels wide, so the payload starts at voxel index 3.
+        # Writing chunk by chunk front to back never clobbers unread input.
+        offset = HEADER_SIZE // VOXEL_DTYPE.itemsize
+        for begin in range(0, num_voxels, chunk_voxels):
+            end = min(begin + chunk_voxels, num_voxels)
+            data[begin:end] = data[offset + begin:offset + end] & VOXEL_MASK
+        data.flush()
+        del data
+        os.truncate(dat_file_path, num_voxels * VOXEL_DTYPE.itemsize)
+    else:
+        data = np.memmap(dat_file_path, dtype=VOXEL_DTYPE, mode='r',
+                         offset=HEADER_SIZE, shape=(num_voxels,))
+        buffer = np.empty(min(chunk_voxels, num_voxels), dtype=VOXEL_DTYPE)
         with open(raw_file_path, 'wb') as raw_file:
-            raw_file.write(raw_data)
+            for begin in range(0, num_voxels, chunk_voxels):
+                end = min(begin + chunk_voxels, num_voxels)
+                out = buffer[:end - begin]
+                np.bitwise_and(data[begin:end], VOXEL_MASK, out=out)
+                out.tofile(raw_file)
+        del data
 
+    if in_place and raw_file_path is not None:
+        os.replace(dat_file_path, raw_file_path)
+
+    elapsed = time.perf_counter() - start
+    if verbose:
+        megabytes = num_voxels * VOXEL_DTYPE.itemsize / 1e6
+        rate = megabytes / elapsed if elapsed > 0 else float('inf')
+        print(f"Converted {os.path.basename(dat_file_path)} "
+              f"({x_size}x{y_size}x{z_size}, {megabytes:.1f} MB) "
+              f"in {elapsed:.2f}s - {rate:.1f} MB/s")
+
+    return x_size, y_size, z_size
+
+
+def raw_volume_shape(raw_file_path):
+    """
+    Read the volume dimensions from a file name such as
+    'footbones832x832x494.raw' and return them in NumPy (z, y, x) order
+    """
+    match = re.search(r'(\d+)x(\d+)x(\d+)', os.path.basename(raw_file_path))
+    if match is None:
+        raise ValueError(f"cannot find XxYxZ dimensions in {raw_file_path!r}, pass the shape explicitly")
+    x_size, y_size, z_size = (int(size) for size in match.groups())
+    return z_size, y_size, x_size
+
+
+def open_raw_volume(raw_file_path, shape=None, dtype='<u2'):
+    # Read-only (z, y, x) memory map of a .raw file or array container written by main.py
+    if shape is None and not is_array_file(raw_file_path):
+        shape = raw_volume_shape(raw_file_path)
+    return load_array(raw_file_path, dtype, None if shape is None else tuple(shape))
+
+
+def file_digest(path):
+    # SHA-256 of the whole file, read in fixed-size blocks
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-if __name__ == '__main__':
-    read_dat_and_convert_to_raw("/Users/ishratjahaneliza/Documents/CS 6635/code/Viz for scientific data/hw3/data/stagbeetle208x208x123.dat",
-                       "/Users/ishratjahaneliza/Documents/CS 6635/code/Viz for scientific data/hw3/data/stagbeetle208x208x123.raw")
-    read_dat_and_convert_to_raw("/Users/ishratjahaneliza/Documents/CS 6635/code/Viz for scientific data/hw3/data/footbones832x832x494.dat",
-                          "/Users/ishratjahaneliza/Documents/CS 6635/code/Viz for scientific data/hw3/data/footbones832x832x494.raw")
-    
 
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    # Write to a temporary file first so an interrupted run never leaves a
+    # half-written manifest behind
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def find_dat_files(patterns):
+    """
+    Expand directories, glob patterns and plain file paths into a sorted
+    list of unique .dat files
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.dat'))
+        else:
+            matches = glob.glob(pattern)
+        found.update(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return sorted(found)
+
+
+def convert_if_changed(dat_file_path, raw_file_path, entry, force=False, brick_size=None):
+    """
+    Convert one volume unless the manifest entry shows it is up to date
+
+    The source is considered unchanged when its size matches and either its
+    mtime matches or, if only the mtime moved, its content hash still matches.
+    The output must also still exist with the recorded size. With
+    `brick_size`, a bricked pyramid is written next to the .raw file as well
+    (see bricks.write_bricked_pyramid) whenever it is missing or stale.
+
+    Returns:
+    tuple: (dat_file_path, new manifest entry, True if anything was written)
+    """
+    stat = os.stat(dat_file_path)
+    up_to_date = False
+    if entry and not force:
+        output_ok = (entry.get('output') == raw_file_path and
+                     os.path.exists(raw_file_path) and
+                     os.path.getsize(raw_file_path) == entry.get('output_size'))
+        if output_ok and entry.get('size') == stat.st_size:
+            if entry.get('mtime_ns') == stat.st_mtime_ns:
+                up_to_date = True
+            elif entry.get('sha256') == file_digest(dat_file_path):
+                entry = dict(entry, mtime_ns=stat.st_mtime_ns)
+                up_to_date = True
+
+    if not up_to_date:
+        shape = read_dat_and_convert_to_raw(dat_file_path, raw_file_path)
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_digest(dat_file_path),
+            'shape': list(shape),
+            'output': raw_file_path,
+            'output_size': os.path.getsize(raw_file_path),
+        }
+
+    if brick_size is None:
+        return dat_file_path, entry, not up_to_date
+
+    bricks_dir = os.path.splitext(raw_file_path)[0] + '.bricks'
+    bricks_entry = {'path': bricks_dir, 'brick_size': brick_size}
+    if (up_to_date and entry.get('bricks') == bricks_entry and
+            os.path.exists(os.path.join(bricks_dir, INDEX_NAME))):
+        return dat_file_path, entry, False
+
+    x_size, y_size, z_size = entry['shape']
+    write_bricked_pyramid(raw_file_path, (z_size, y_size, x_size), bricks_dir, brick_size)
+    return dat_file_path, dict(entry, bricks=bricks_entry), True
+
+
+def convert_batch(dat_file_paths, output_dir=None, manifest_path=None, jobs=None, force=False,
+                  brick_size=None, suffix='.raw'):
+    """
+    Convert many .dat volumes in parallel, skipping the ones whose source and
+    output are unchanged since the last run
+
+    Parameters:
+    dat_file_paths (list): Input .dat files
+    output_dir (str): Directory for the .raw files, next to each input if None
+    manifest_path (str): JSON manifest recording what has been converted,
+        defaults to MANIFEST_NAME inside `output_dir` (or the current directory)
+    jobs (int): Number of worker processes, one per CPU if None
+    force (bool): Convert everything regardless of the manifest
+    brick_size (int): Also write a bricked pyramid with this brick size
+    suffix (str): Output extension, ARRAY_SUFFIX writes array containers
+
+    Returns:
+    dict: Counts of 'converted', 'skipped' and 'failed' volumes
+    """
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir or '.', MANIFEST_NAME)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+
+    counts = {'converted': 0, 'skipped': 0, 'failed': 0}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {}
+        for dat_file_path in dat_file_paths:
+            base = os.path.splitext(os.path.basename(dat_file_path))[0] + suffix
+            raw_file_path = os.path.abspath(os.path.join(
+                output_dir or os.path.dirname(dat_file_path), base))
+            future = pool.submit(convert_if_changed, dat_file_path, raw_file_path,
+                                 manifest.get(dat_file_path), force, brick_size)
+            futures[future] = dat_file_path
+
+        for future in as_completed(futures):
+            try:
+                dat_file_path, entry, converted = future.result()
+            except Exception as e:
+                print(f"Failed to convert {futures[future]}: {e}")
+                counts['failed'] += 1
+                continue
+            manifest[dat_file_path] = entry
+            if converted:
+                counts['converted'] += 1
+            else:
+                print(f"Skipping {os.path.basename(dat_file_path)} (up to date)")
+                counts['skipped'] += 1
+
+    save_manifest(manifest, manifest_path)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert .dat volumes to 12-bit .raw files')
+    parser.add_argument('inputs', nargs='+',
+                        help='.dat files, directories containing them, or glob patterns')
+    parser.add_argument('-o', '--output-dir', default=None,
+                        help='Directory for the .raw files (default: next to each input)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--manifest', default=None,
+                        help=f'Manifest file (default: {MANIFEST_NAME} in the output directory)')
+    parser.add_argument('--bricks', action='store_true',
+                        help='Also write a bricked multi-resolution pyramid next to each .raw file')
+    parser.add_argument('--brick-size', type=int, default=BRICK_SIZE,
+                        help=f'Brick edge length in voxels (default: {BRICK_SIZE})')
+    parser.add_argument('--container', action='store_true',
+                        help=f'Write self-describing {ARRAY_SUFFIX} array containers instead of .raw files')
+    parser.add_argument('--force', action='store_true',
+                        help='Convert every input even if it is up to date')
+    args = parser.parse_args()
+
+    dat_file_paths = find_dat_files(args.inputs)
+    if not dat_file_paths:
+        parser.error('no .dat files found')
+
+    start = time.perf_counter()
+    counts = convert_batch(dat_file_paths, args.output_dir, args.manifest, args.jobs, args.force,
+                           args.brick_size if args.bricks else None,
+                           ARRAY_SUFFIX if args.container else '.raw')
+    print(f"{counts['converted']} converted, {counts['skipped']} up to date, "
+          f"{counts['failed']} failed in {time.perf_counter() - start:.2f}s")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
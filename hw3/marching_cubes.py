@@ -0,0 +1,295 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from main import open_raw_volume
+
+SLAB_DEPTH = 32             # cube layers per work item
+OBJ_CHUNK = 1 << 18         # vertices/faces formatted per OBJ write
+
+# Cube corner c sits at offset (c & 1, c >> 1 & 1, c >> 2 & 1) in (x, y, z)
+CORNER_OFFSETS = np.array([(c & 1, c >> 1 & 1, c >> 2 & 1) for c in range(8)])
+
+# Cube edge n runs from corner EDGE_CORNER[n] one voxel along axis EDGE_AXIS[n] (0 x, 1 y, 2 z)
+CUBE_EDGES = [(c, axis) for c in range(8) for axis in range(3) if not c >> axis & 1]
+EDGE_CORNER = np.array([c for c, _ in CUBE_EDGES])
+EDGE_AXIS = np.array([axis for _, axis in CUBE_EDGES])
+
+
+def _face_cycles():
+    # The 6 cube faces as corner cycles, each with the edge between
+    # consecutive corners
+    cycles = []
+    for axis in range(3):
+        u, v = [a for a in range(3) if a != axis]
+        for side in (0, 1):
+            corners = [side << axis | du << u | dv << v for du, dv in ((0, 0), (1, 0), (1, 1), (0, 1))]
+            edges = []
+            for k in range(4):
+                a, b = corners[k], corners[(k + 1) % 4]
+                low, along = min(a, b), (a ^ b).bit_length() - 1
+                edges.append(CUBE_EDGES.index((low, along)))
+            cycles.append((corners, edges))
+    return cycles
+
+
+def _triangulate_loop(loop, edge_faces):
+    # Split a loop of cube edges into triangles using only diagonals that do
+    # not lie in a cube face; a diagonal inside a face could clash with the
+    # triangles of the neighbouring cube
+    if len(loop) == 3:
+        return [tuple(loop)]
+    for i in range(len(loop) - 2):
+        for j in range(i + 2, len(loop) - (i == 0)):
+            if edge_faces[loop[i]] & edge_faces[loop[j]]:
+                continue
+            first = _triangulate_loop(loop[i:j + 1], edge_faces)
+            second = _triangulate_loop(loop[j:] + loop[:i + 1], edge_faces)
+            if first is not None and second is not None:
+                return first + second
+    return None
+
+
+def _build_triangle_table():
+    """
+    Triangulation of the isosurface inside a cube for each of the 256 cases
+
+    Instead of a hand-typed table, the crossing points on each face are
+    paired into segments (on a face with two diagonal inside corners, each
+    inside corner is cut off separately, the same decision the neighbouring
+    cube makes for the shared face, so the surface stays closed). The
+    segments form closed loops, which are oriented with their normal
+    pointing from inside (>= isovalue) to outside and split into triangles.
+
+    Returns:
+    ndarray: (256, MAX_TRIANGLES, 3) cube edge numbers, -1 for unused rows
+    """
+    cycles = _face_cycles()
+    edge_faces = [{f for f, (_, face_edges) in enumerate(cycles) if n in face_edges} for n in range(12)]
+    corners = CORNER_OFFSETS.astype(float)
+    midpoints = corners[EDGE_CORNER] + 0.5 * np.eye(3)[EDGE_AXIS]
+    table = []
+    for case in range(256):
+        inside = [bool(case >> c & 1) for c in range(8)]
+        crossed = [inside[c] != inside[c | 1 << axis] for c, axis in CUBE_EDGES]
+
+        links = {n: [] for n in range(12) if crossed[n]}
+        for face_corners, face_edges in cycles:
+            hit = [k for k in range(4) if crossed[face_edges[k]]]
+            if len(hit) == 2:
+                pairs = [(face_edges[hit[0]], face_edges[hit[1]])]
+            elif len(hit) == 4:
+                pairs = [(face_edges[k - 1], face_edges[k]) for k in range(4) if inside[face_corners[k]]]
+            else:
+                pairs = []
+            for a, b in pairs:
+                links[a].append(b)
+                links[b].append(a)
+
+        triangles = []
+        unvisited = set(links)
+        while unvisited:
+            loop = [min(unvisited)]
+            unvisited.discard(loop[0])
+            while True:
+                following = [n for n in links[loop[-1]] if n in unvisited]
+                if not following:
+                    break
+                loop.append(following[0])
+                unvisited.discard(following[0])
+
+            points = midpoints[loop]
+            normal = np.cross(points, np.roll(points, -1, axis=0)).sum(axis=0)
+            outward = sum((1 if inside[EDGE_CORNER[n]] else -1) * np.eye(3)[EDGE_AXIS[n]] for n in loop)
+            if np.dot(normal, outward) < 0:
+                loop.reverse()
+            triangles += _triangulate_loop(loop, edge_faces)
+        table.append(triangles)
+
+    max_triangles = max(len(triangles) for triangles in table)
+    array = np.full((256, max_triangles, 3), -1, dtype=np.int8)
+    for case, triangles in enumerate(table):
+        if triangles:
+            array[case, :len(triangles)] = triangles
+    return array
+
+
+TRIANGLE_TABLE = _build_triangle_table()
+
+
+def slab_surface(volume, z0, depth, isovalue):
+    """
+    Isosurface of the cube layers z0 .. z0 + depth - 1 of a volume
+
+    Vertices are identified by the global ID of the voxel edge they lie on,
+    3 * ((z * ny + y) * nx + x) + axis, so slabs can be merged without
+    duplicating the vertices on their shared boundary plane.
+
+    Parameters:
+    volume (ndarray): (z, y, x) volume, usually a memory map
+    z0 (int): First cube layer
+    depth (int): Number of cube layers; depth + 1 voxel slices are read
+    isovalue (float): Surface value, voxels >= isovalue are inside
+
+    Returns:
+    ndarray: Sorted int64 edge IDs of the slab's vertices
+    ndarray: (n, 3) float32 vertex positions in voxel (x, y, z) coordinates
+    ndarray: (m, 3) int64 triangles as indices into the vertices
+    """
+    nz, ny, nx = volume.shape
+    depth = min(depth, nz - 1 - z0)
+    block = np.asarray(volume[z0:z0 + depth + 1], dtype=np.float32)
+
+    cases = np.zeros((depth, ny - 1, nx - 1), dtype=np.uint8)
+    for c, (dx, dy, dz) in enumerate(CORNER_OFFSETS):
+        cases |= (block[dz:dz + depth, dy:dy + ny - 1, dx:dx + nx - 1] >= isovalue).astype(np.uint8) << c
+    z, y, x = np.nonzero((cases != 0) & (cases != 255))
+    triangles = TRIANGLE_TABLE[cases[z, y, x]]
+    del cases
+    cube, row = np.nonzero(triangles[:, :, 0] >= 0)
+    edges = triangles[cube, row].astype(np.intp)               # (m, 3) cube edge numbers
+
+    start = CORNER_OFFSETS[EDGE_CORNER[edges]]                  # (m, 3, 3) corner offsets in x, y, z
+    px = x[cube, None] + start[..., 0]
+    py = y[cube, None] + start[..., 1]
+    pz = z[cube, None] + start[..., 2] + z0
+    ids = 3 * ((pz.astype(np.int64) * ny + py) * nx + px) + EDGE_AXIS[edges]
+    edge_ids, faces = np.unique(ids, return_inverse=True)
+
+    point, axis = np.divmod(edge_ids, 3)
+    pz, rest = np.divmod(point, ny * nx)
+    py, px = np.divmod(rest, nx)
+    step = np.eye(3, dtype=np.int64)[axis]
+    lz = pz - z0
+    v0 = block[lz, py, px]
+    v1 = block[lz + step[:, 2], py + step[:, 1], px + step[:, 0]]
+    t = (isovalue - v0) / (v1 - v0)
+    vertices = np.column_stack([px, py, pz]).astype(np.float32) + t[:, None] * step
+    return edge_ids, vertices.astype(np.float32), faces.reshape(-1, 3)
+
+
+_worker_volume = None
+
+
+def _init_worker(raw_file_path, shape, dtype):
+    global _worker_volume
+    _worker_volume = open_raw_volume(raw_file_path, shape, dtype)
+
+
+def _slab_surface(z0, depth, isovalue):
+    return slab_surface(_worker_volume, z0, depth, isovalue)
+
+
+def merge_slabs(slabs):
+    """
+    Join slab meshes, keeping one vertex per voxel edge
+
+    Parameters:
+    slabs (list): (edge_ids, vertices, faces) from slab_surface
+
+    Returns:
+    ndarray: (n, 3) float32 vertices
+    ndarray: (m, 3) int64 triangles
+    """
+    if not slabs:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.int64)
+    offsets = np.cumsum([0] + [len(edge_ids) for edge_ids, _, _ in slabs])
+    _, first, index = np.unique(np.concatenate([edge_ids for edge_ids, _, _ in slabs]),
+                                return_index=True, return_inverse=True)
+    vertices = np.concatenate([vertices for _, vertices, _ in slabs])[first]
+    faces = np.concatenate([faces + offset for (_, _, faces), offset in zip(slabs, offsets)])
+    return vertices, index.reshape(-1)[faces]
+
+
+def extract_isosurface(raw_file_path, isovalue, shape=None, dtype='<u2', slab_depth=SLAB_DEPTH, jobs=None):
+    """
+    Marching cubes over a .raw volume, one z-slab per work item
+
+    Every worker memory-maps the volume and reads only slab_depth + 1
+    slices at a time, so memory use is bounded by the slab size times the
+    number of jobs (plus the mesh itself), not by the volume size.
+
+    Parameters:
+    raw_file_path (str): Volume written by main.py (.raw or array container)
+    isovalue (float): Surface value, voxels >= isovalue are inside
+    shape (tuple): (z, y, x) volume shape, parsed from the file name if None
+    dtype (str): Voxel dtype of a headerless .raw file
+    slab_depth (int): Cube layers per slab
+    jobs (int): Worker processes, os.cpu_count() if None
+
+    Returns:
+    ndarray: (n, 3) float32 vertices in voxel (x, y, z) coordinates
+    ndarray: (m, 3) int64 triangles, normals pointing towards lower values
+    """
+    nz = open_raw_volume(raw_file_path, shape, dtype).shape[0]
+    starts = list(range(0, nz - 1, slab_depth))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(raw_file_path, shape, dtype)) as pool:
+        slabs = list(pool.map(partial(_slab_surface, depth=slab_depth, isovalue=isovalue), starts))
+    return merge_slabs(slabs)
+
+
+def write_ply(path, vertices, faces):
+    # Binary little-endian PLY
+    header = (f"ply\nformat binary_little_endian 1.0\n"
+              f"element vertex {len(vertices)}\n"
+              f"property float x\nproperty float y\nproperty float z\n"
+              f"element face {len(faces)}\n"
+              f"property list uchar int vertex_indices\nend_header\n")
+    records = np.empty(len(faces), dtype=[('count', 'u1'), ('indices', '<i4', (3,))])
+    records['count'] = 3
+    records['indices'] = faces
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        np.asarray(vertices, dtype='<f4').tofile(f)
+        records.tofile(f)
+
+
+def write_obj(path, vertices, faces):
+    # Wavefront OBJ (text), written in chunks
+    with open(path, 'w') as f:
+        for begin in range(0, len(vertices), OBJ_CHUNK):
+            np.savetxt(f, vertices[begin:begin + OBJ_CHUNK], fmt='v %.6g %.6g %.6g')
+        for begin in range(0, len(faces), OBJ_CHUNK):
+            np.savetxt(f, faces[begin:begin + OBJ_CHUNK] + 1, fmt='f %d %d %d')
+
+
+def write_mesh(path, vertices, faces):
+    if path.endswith('.obj'):
+        write_obj(path, vertices, faces)
+    elif path.endswith('.ply'):
+        write_ply(path, vertices, faces)
+    else:
+        raise ValueError(f"unknown mesh format for {path!r}, use .ply or .obj")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Marching cubes isosurfaces of hw3 .raw volumes')
+    parser.add_argument('volume', help='.raw volume written by main.py')
+    parser.add_argument('isovalue', type=float)
+    parser.add_argument('-o', '--output', default=None,
+                        help='Mesh file, .ply (binary) or .obj (default: <volume>_<isovalue>.ply)')
+    parser.add_argument('--shape', type=int, nargs=3, metavar=('X', 'Y', 'Z'), default=None,
+                        help='Volume dimensions (default: parsed from the file name)')
+    parser.add_argument('--slab-depth', type=int, default=SLAB_DEPTH,
+                        help=f'Voxel slices per work item, bounds memory per worker (default: {SLAB_DEPTH})')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    shape = tuple(reversed(args.shape)) if args.shape else None
+    output = args.output or f'{os.path.splitext(args.volume)[0]}_{args.isovalue:g}.ply'
+    start = time.perf_counter()
+    vertices, faces = extract_isosurface(args.volume, args.isovalue, shape, slab_depth=args.slab_depth,
+                                         jobs=args.jobs)
+    write_mesh(output, vertices, faces)
+    print(f"Wrote {len(vertices)} vertices and {len(faces)} triangles to {output} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+import argparse
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from main import open_raw_volume
+
+LUT_SIZE = 4096             # one entry per 12-bit voxel value
+BLOCK_SIZE = 8              # edge of the min/max cells used for empty-space skipping
+TILE_SIZE = 64
+TERMINATION_ALPHA = 0.99    # early ray termination threshold
+
+
+def transfer_function_lut(rgb_points, opacity_points, size=LUT_SIZE):
+    """
+    Sample a 1D transfer function into a (size, 4) RGBA lookup table
+
+    Parameters:
+    rgb_points (array): Flat ParaView 'RGBPoints' list (value, r, g, b, ...)
+    opacity_points (array): Flat ParaView 'Points' list (value, alpha, midpoint, sharpness, ...).
+        Midpoint and sharpness are ignored, opacity is interpolated linearly
+    size (int): Number of table entries, covering values 0 .. size-1
+
+    Returns:
+    ndarray: float32 RGBA table, indexed by voxel value
+    """
+    rgb = np.asarray(rgb_points, dtype=float).reshape(-1, 4)
+    opacity = np.asarray(opacity_points, dtype=float).reshape(-1, 4)
+    values = np.arange(size)
+    lut = np.empty((size, 4), dtype=np.float32)
+    for channel in range(3):
+        lut[:, channel] = np.interp(values, rgb[:, 0], rgb[:, channel + 1])
+    lut[:, 3] = np.interp(values, opacity[:, 0], opacity[:, 1])
+    return lut
+
+
+def load_pvsm_transfer_functions(pvsm_path):
+    """
+    Extract the colour/opacity transfer functions saved in a ParaView state
+
+    Returns:
+    list: (name, rgb_points, opacity_points) for every lookup table that has
+    a scalar opacity function, in file order
+    """
+    root = ET.parse(pvsm_path).getroot()
+
+    def points(proxy, name):
+        for prop in proxy.iter('Property'):
+            if prop.get('name') == name:
+                return [float(element.get('value')) for element in prop.iter('Element')]
+        return None
+
+    proxies = {proxy.get('id'): proxy for proxy in root.iter('Proxy') if proxy.get('group')}
+    transfer_functions = []
+    for proxy_id, proxy in proxies.items():
+        if proxy.get('type') != 'PVLookupTable':
+            continue
+        rgb_points = points(proxy, 'RGBPoints')
+        opacity_ref = None
+        for prop in proxy.iter('Property'):
+            if prop.get('name') == 'ScalarOpacityFunction':
+                ref = prop.find('Proxy')
+                opacity_ref = ref.get('value') if ref is not None else None
+        if not rgb_points or opacity_ref not in proxies:
+            continue
+        opacity_points = points(proxies[opacity_ref], 'Points')
+        if not opacity_points:
+            continue
+        name = f"{os.path.splitext(os.path.basename(pvsm_path))[0]}_{proxy_id}"
+        transfer_functions.append((name, rgb_points, opacity_points))
+    return transfer_functions
+
+
+def block_min_max(volume, block_size=BLOCK_SIZE):
+    """
+    Per-cell min/max over block_size^3 cells, computed one slab at a time
+
+    Each cell's range also covers its +1 neighbours so it bounds every
+    trilinear sample taken inside the cell.
+    """
+    z_size, y_size, x_size = volume.shape
+    grid = [-(-size // block_size) for size in volume.shape]
+    cell_min = np.empty(grid, dtype=volume.dtype)
+    cell_max = np.empty(grid, dtype=volume.dtype)
+    for bz in range(grid[0]):
+        slab = np.asarray(volume[bz * block_size:(bz + 1) * block_size])
+        pad = [(0, block_size - slab.shape[0]), (0, grid[1] * block_size - y_size),
+               (0, grid[2] * block_size - x_size)]
+        slab = np.pad(slab, pad, mode='edge').reshape(
+            block_size, grid[1], block_size, grid[2], block_size)
+        cell_min[bz] = slab.min(axis=(0, 2, 4))
+        cell_max[bz] = slab.max(axis=(0, 2, 4))
+
+    for axis in range(3):
+        # Widen every cell by its upper neighbour along each axis
+        upper = [slice(None)] * 3
+        lower = [slice(None)] * 3
+        upper[axis] = slice(1, None)
+        lower[axis] = slice(None, -1)
+        np.minimum(cell_min[tuple(lower)], cell_min[tuple(upper)], out=cell_min[tuple(lower)])
+        np.maximum(cell_max[tuple(lower)], cell_max[tuple(upper)], out=cell_max[tuple(lower)])
+    return cell_min, cell_max
+
+
+def occupied_cells(cell_min, cell_max, lut):
+    # A cell can be skipped when every value in its [min, max] range is transparent
+    visible = np.concatenate([[0], np.cumsum(lut[:, 3] > 0)])
+    lo = np.clip(cell_min.astype(np.int64), 0, len(lut) - 1)
+    hi = np.clip(cell_max.astype(np.int64), 0, len(lut) - 1)
+    return visible[hi + 1] - visible[lo] > 0
+
+
+def camera_rays(shape, width, height, azimuth, elevation, zoom=1.0):
+    """
+    Orthographic rays looking at the volume centre
+
+    Positions and directions are in voxel index space (x, y, z). The image
+    plane is sized to the bounding sphere of the volume divided by `zoom`.
+
+    Returns:
+    tuple: (origins, direction, near, far), origins has shape (height, width, 3)
+    """
+    z_size, y_size, x_size = shape
+    upper = np.array([x_size - 1, y_size - 1, z_size - 1], dtype=float)
+    centre = upper / 2
+    radius = np.linalg.norm(upper) / 2 + 1
+
+    az, el = np.radians(azimuth), np.radians(elevation)
+    direction = -np.array([np.cos(el) * np.sin(az), np.cos(el) * np.cos(az), np.sin(el)])
+    up = np.array([0.0, 0.0, 1.0])
+    if abs(np.dot(up, direction)) > 0.999:
+        up = np.array([0.0, 1.0, 0.0])
+    right = np.cross(direction, up)
+    right /= np.linalg.norm(right)
+    up = np.cross(right, direction)
+
+    half = radius / zoom
+    aspect = width / height
+    u = np.linspace(-half * aspect, half * aspect, width)
+    v = np.linspace(half, -half, height)
+    origins = (centre - direction * radius +
+               u[None, :, None] * right + v[:, None, None] * up)
+
+    # Slab test against the box [0, upper] on every axis
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t0 = (0 - origins) / direction
+        t1 = (upper - origins) / direction
+    t0 = np.where(direction == 0, -np.inf, t0)
+    t1 = np.where(direction == 0, np.inf, t1)
+    inside = np.all((direction != 0) | ((origins >= 0) & (origins <= upper)), axis=-1)
+    near = np.maximum(np.minimum(t0, t1).max(axis=-1), 0)
+    far = np.maximum(t0, t1).min(axis=-1)
+    far = np.where(inside, far, -np.inf)
+    return origins, direction, near, far
+
+
+def trilinear(volume, flat, positions):
+    # Trilinear samples of a (z, y, x) volume at (n, 3) positions in (x, y, z) order
+    z_size, y_size, x_size = volume.shape
+    upper = np.array([max(x_size - 2, 0), max(y_size - 2, 0), max(z_size - 2, 0)])
+    base = np.clip(np.floor(positions).astype(np.int64), 0, upper)
+    frac = np.clip(positions - base, 0, 1)
+    strides = np.array([1, x_size, x_size * y_size])
+    index = base @ strides
+    result = np.zeros(len(positions))
+    for corner in range(8):
+        offset = np.array([corner & 1, (corner >> 1) & 1, (corner >> 2) & 1])
+        weight = np.prod(np.where(offset, frac, 1 - frac), axis=1)
+        result += weight * flat[index + offset @ strides]
+    return result
+
+
+def march_rays(volume, lut, occupied, origins, direction, near, far, step=0.5, block_size=BLOCK_SIZE):
+    """
+    Front-to-back compositing of a batch of rays
+
+    Rays advance in lockstep; a ray whose current min/max cell is fully
+    transparent jumps to the cell's exit point, and a ray stops once its
+    accumulated opacity reaches TERMINATION_ALPHA.
+
+    Returns:
+    ndarray: (n_rays, 4) premultiplied RGBA
+    """
+    flat = volume.reshape(-1)
+    n_rays = len(origins)
+    colour = np.zeros((n_rays, 3))
+    alpha = np.zeros(n_rays)
+    t = near.copy()
+    active = np.flatnonzero(t <= far)
+    grid = np.array(occupied.shape[::-1])   # (x, y, z) cell counts
+    with np.errstate(divide='ignore'):
+        inverse = np.where(direction != 0, 1 / direction, 0)
+    lut_max = len(lut) - 1
+
+    while active.size:
+        positions = origins[active] + t[active, None] * direction
+        cells = np.clip((positions // block_size).astype(np.int64), 0, grid - 1)
+        busy = occupied[cells[:, 2], cells[:, 1], cells[:, 0]]
+
+        # Empty space: jump to where the ray leaves the current cell,
+        # rounded up to the next sample position along the ray
+        empty = active[~busy]
+        if empty.size:
+            cell = cells[~busy]
+            bound = (cell + (direction > 0)) * block_size
+            exit_t = np.where(direction != 0, (bound - origins[empty]) * inverse, np.inf).min(axis=1)
+            steps = np.ceil((exit_t - near[empty]) / step - 1e-9)
+            t[empty] = np.maximum(near[empty] + steps * step, t[empty] + step)
+
+        hit = active[busy]
+        if hit.size:
+            values = trilinear(volume, flat, positions[busy])
+            rgba = lut[np.clip(np.rint(values).astype(np.int64), 0, lut_max)]
+            sample_alpha = 1 - (1 - rgba[:, 3]) ** step    # opacity per unit length
+            weight = (1 - alpha[hit]) * sample_alpha
+            colour[hit] += weight[:, None] * rgba[:, :3]
+            alpha[hit] += weight
+            t[hit] += step
+
+        active = active[(t[active] <= far[active]) & (alpha[active] < TERMINATION_ALPHA)]
+
+    return np.concatenate([colour, alpha[:, None]], axis=1)
+
+
+_worker_volume = None
+
+
+def _init_worker(raw_file_path, shape, dtype):
+    global _worker_volume
+    _worker_volume = open_raw_volume(raw_file_path, shape, dtype)
+
+
+def _render_tile(tile, origins, direction, near, far, lut, occupied, step, block_size):
+    rows, cols = origins.shape[:2]
+    rgba = march_rays(_worker_volume, lut, occupied, origins.reshape(-1, 3), direction,
+                      near.ravel(), far.ravel(), step, block_size)
+    return tile, rgba.reshape(rows, cols, 4)
+
+
+def render_volume(raw_file_path, transfer_functions, shape=None, dtype='<u2', width=512, height=512,
+                  azimuth=30.0, elevation=20.0, zoom=1.0, step=0.5, block_size=BLOCK_SIZE,
+                  tile_size=TILE_SIZE, jobs=None, background=(0.0, 0.0, 0.0)):
+    """
+    Ray-cast a .raw volume once per transfer function
+
+    The image is split into tile_size x tile_size tiles rendered on a process
+    pool. Every worker memory-maps the volume itself, so only ray batches and
+    the lookup tables cross process boundaries. The per-cell min/max grid is
+    computed once and reused for all transfer functions.
+
+    Parameters:
+    raw_file_path (str): uint16 .raw volume or array container
+    transfer_functions (list): RGBA lookup tables from transfer_function_lut
+    shape (tuple): (z, y, x) dimensions, from the container header or the
+        file name if None
+    width, height (int): Image size in pixels
+    azimuth, elevation (float): Camera direction in degrees
+    zoom (float): Magnification relative to fitting the whole volume
+    step (float): Sampling distance along a ray in voxels
+    block_size (int): Edge of the empty-space skipping cells in voxels
+    tile_size (int): Edge of an image tile sent to one worker
+    jobs (int): Number of worker processes, one per CPU if None
+    background (tuple): RGB colour behind the volume
+
+    Returns:
+    list: One (height, width, 3) float image per transfer function
+    """
+    volume = open_raw_volume(raw_file_path, shape, dtype)
+    shape = volume.shape
+    cell_min, cell_max = block_min_max(volume, block_size)
+    del volume
+
+    origins, direction, near, far = camera_rays(shape, width, height, azimuth, elevation, zoom)
+    tiles = [(row, col) for row in range(0, height, tile_size) for col in range(0, width, tile_size)]
+    images = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(raw_file_path, tuple(shape), dtype)) as pool:
+        for lut in transfer_functions:
+            occupied = occupied_cells(cell_min, cell_max, lut)
+            futures = []
+            for row, col in tiles:
+                window = (slice(row, row + tile_size), slice(col, col + tile_size))
+                futures.append(pool.submit(_render_tile, (row, col), origins[window], direction,
+                                           near[window], far[window], lut, occupied, step, block_size))
+            rgba = np.zeros((height, width, 4))
+            for future in futures:
+                (row, col), tile = future.result()
+                rgba[row:row + tile.shape[0], col:col + tile.shape[1]] = tile
+            image = rgba[..., :3] + (1 - rgba[..., 3:]) * np.asarray(background)
+            images.append(np.clip(image, 0, 1))
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless volume ray-caster for hw3 .raw volumes')
+    parser.add_argument('volume', help='.raw volume written by main.py')
+    parser.add_argument('states', nargs='+', help='ParaView .pvsm files to take transfer functions from')
+    parser.add_argument('--shape', type=int, nargs=3, metavar=('X', 'Y', 'Z'), default=None,
+                        help='Volume dimensions (default: parsed from the file name)')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'), default=(512, 512))
+    parser.add_argument('--azimuth', type=float, default=30.0)
+    parser.add_argument('--elevation', type=float, default=20.0)
+    parser.add_argument('--zoom', type=float, default=1.0)
+    parser.add_argument('--step', type=float, default=0.5, help='Sample spacing in voxels')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('-o', '--output-dir', default='.')
+    args = parser.parse_args()
+
+    shape = tuple(reversed(args.shape)) if args.shape else None
+    names = []
+    luts = []
+    for state in args.states:
+        for name, rgb_points, opacity_points in load_pvsm_transfer_functions(state):
+            names.append(name)
+            luts.append(transfer_function_lut(rgb_points, opacity_points))
+    if not luts:
+        parser.error('no transfer functions found in the given states')
+
+    start = time.perf_counter()
+    width, height = args.size
+    images = render_volume(args.volume, luts, shape, width=width, height=height, azimuth=args.azimuth,
+                           elevation=args.elevation, zoom=args.zoom, step=args.step, jobs=args.jobs)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, image in zip(names, images):
+        plt.imsave(os.path.join(args.output_dir, f'{name}.png'), image)
+    print(f"Rendered {len(images)} images in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
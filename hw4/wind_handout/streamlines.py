@@ -0,0 +1,525 @@
+"""
+Batched streamline integration over a 2D vector field
+
+The field is indexed like `vecs` in wind.py after its transpose: vecs[x, y]
+holds the (u, v) vector at grid point (x, y). All seeds are advanced
+together as an (n_seeds, 2) array; a seed drops out of the batch once it
+has left the domain [0, nx - 1) x [0, ny - 1).
+"""
+import math
+
+import numpy as np
+
+
+class Streamlines:
+    """
+    Ragged set of streamlines stored in flat arrays
+
+    points[offsets[n]:offsets[n + 1]] are the points of line n, in order.
+    Iterating yields each line as an (m, 2) view.
+    """
+
+    def __init__(self, points, offsets, evaluations=None):
+        self.points = points
+        self.offsets = offsets
+        self.evaluations = evaluations
+
+    @classmethod
+    def from_steps(cls, n_lines, line_ids, points, evaluations=None):
+        """
+        Build the ragged layout from points recorded step by step
+
+        Parameters:
+        n_lines (int): Number of streamlines
+        line_ids (list): One array of line indices per recorded step
+        points (list): One (k, 2) array of points per recorded step
+        evaluations (ndarray): Field evaluations spent on each line
+        """
+        line_ids = np.concatenate(line_ids) if line_ids else np.empty(0, dtype=np.intp)
+        points = np.concatenate(points) if points else np.empty((0, 2))
+        order = np.argsort(line_ids, kind='stable')
+        offsets = np.zeros(n_lines + 1, dtype=np.intp)
+        np.cumsum(np.bincount(line_ids, minlength=n_lines), out=offsets[1:])
+        return cls(points[order], offsets, evaluations)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, n):
+        return self.points[self.offsets[n]:self.offsets[n + 1]]
+
+    def __iter__(self):
+        return (self[n] for n in range(len(self)))
+
+    def lengths(self):
+        # Number of points of every line
+        return np.diff(self.offsets)
+
+    def arc_lengths(self):
+        # Length of every line along its points
+        travelled = np.zeros(len(self.points))
+        travelled[1:] = np.cumsum(np.linalg.norm(np.diff(self.points, axis=0), axis=1))
+        return travelled[self.offsets[1:] - 1] - travelled[self.offsets[:-1]]
+
+
+def in_domain(vecs, points):
+    # Points bilinear_sample can interpolate: 0 <= x < nx - 1, 0 <= y < ny - 1
+    x, y = points[:, 0], points[:, 1]
+    return (x >= 0) & (y >= 0) & (x < vecs.shape[0] - 1) & (y < vecs.shape[1] - 1)
+
+
+def bilinear_sample(vecs, points):
+    """
+    Vectorized bilinear_interpolation from wind.py
+
+    Parameters:
+    vecs (ndarray): (nx, ny, 2) vector field. Should be C-contiguous,
+        otherwise it is copied on every call (see contiguous_field)
+    points (ndarray): (n, 2) positions in (x, y) grid coordinates
+
+    Returns:
+    ndarray: (n, 2) interpolated vectors, zero outside the domain (the
+        behaviour of func in wind.py's rk4)
+    """
+    ny = vecs.shape[1]
+    field = vecs.reshape(-1, 2)
+    inside = in_domain(vecs, points)
+    x = np.where(inside, points[:, 0], 0.0)
+    y = np.where(inside, points[:, 1], 0.0)
+    x1 = x.astype(np.intp)
+    y1 = y.astype(np.intp)
+    fx = (x - x1)[:, None]
+    fy = (y - y1)[:, None]
+    # np.take on the flattened field is much faster than 2D fancy indexing
+    corner = x1 * ny + y1
+    result = (np.take(field, corner, axis=0) * (1 - fx) * (1 - fy) +
+              np.take(field, corner + ny, axis=0) * fx * (1 - fy) +
+              np.take(field, corner + 1, axis=0) * (1 - fx) * fy +
+              np.take(field, corner + ny + 1, axis=0) * fx * fy)
+    result[~inside] = 0
+    return result
+
+
+def contiguous_field(vecs):
+    # C-contiguous float copy of a field (no copy if it already is one), such
+    # as wind.py's transposed memory map
+    return np.ascontiguousarray(vecs, dtype=float)
+
+
+def euler_step(vecs, points, step_size):
+    return points + step_size * bilinear_sample(vecs, points), 1
+
+
+def rk4_step(vecs, points, step_size):
+    k1 = bilinear_sample(vecs, points)
+    k2 = bilinear_sample(vecs, points + 0.5 * step_size * k1)
+    k3 = bilinear_sample(vecs, points + 0.5 * step_size * k2)
+    k4 = bilinear_sample(vecs, points + step_size * k3)
+    return points + step_size * (k1 + 2 * k2 + 2 * k3 + k4) / 6, 4
+
+
+# Fixed-step methods: step(vecs, points, step_size) -> (new points, field evaluations per point)
+STEPPERS = {'euler': euler_step, 'rk4': rk4_step}
+
+
+def integrate(vecs, seeds, step_size, steps, method='rk4'):
+    """
+    Trace streamlines from all seeds at once with a fixed step size
+
+    Every step advances the seeds that are still inside the domain; a seed
+    whose current point has left it stops, so (as in euler_method) a line
+    may end with one point outside. Unlike wind.py's rk4, which keeps
+    repeating such a point, RK4 lines stop there too.
+
+    Parameters:
+    vecs (ndarray): (nx, ny, 2) vector field indexed [x, y]
+    seeds (array): (n, 2) seed points in (x, y)
+    step_size (float): Integration step
+    steps (int): Maximum number of steps per line
+    method (str): A key of STEPPERS
+
+    Returns:
+    Streamlines: One line per seed, seed point first
+    """
+    step = STEPPERS[method]
+    vecs = contiguous_field(vecs)
+    points = np.array(seeds, dtype=float).reshape(-1, 2)
+    active = np.arange(len(points))
+    evaluations = np.zeros(len(points), dtype=np.int64)
+    line_ids = [active]
+    recorded = [points]
+    for _ in range(steps):
+        inside = in_domain(vecs, points)
+        active, points = active[inside], points[inside]
+        if not len(active):
+            break
+        points, cost = step(vecs, points, step_size)
+        evaluations[active] += cost
+        line_ids.append(active)
+        recorded.append(points)
+    return Streamlines.from_steps(len(seeds), line_ids, recorded, evaluations)
+
+
+# Dormand-Prince 5(4) tableau; the 5th-order weights are the last row of
+# DP_A, so the final stage is the derivative at the new point (FSAL)
+DP_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+# 5th-order minus embedded 4th-order weights, for the error estimate
+DP_E = [71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40]
+
+
+def integrate_adaptive(vecs, seeds, max_time=None, max_length=None, rtol=0.0, atol=1e-4,
+                       initial_step=0.1, min_step=1e-6, max_step=1.0, max_cells=1.0, max_steps=10000):
+    """
+    Trace streamlines with per-seed adaptive steps (Dormand-Prince RK45)
+
+    Every seed keeps its own step size. A step is accepted when the
+    embedded error estimate is within atol + rtol * |position| (RMS over x
+    and y), and the next step is scaled by 0.9 * error^(-1/5), limited to
+    0.2x..5x and [min_step, max_step]. Steps at min_step are always
+    accepted. As in integrate, a seed stops once its current point has
+    left the domain, and also where the field is zero.
+
+    The bilinear field has kinks at cell boundaries that the error estimate
+    cannot see, so steps are also kept to about max_cells grid cells.
+
+    Parameters:
+    vecs (ndarray): (nx, ny, 2) vector field indexed [x, y]
+    seeds (array): (n, 2) seed points in (x, y)
+    max_time (float): Stop after this much integration time (the total
+        of step_size * steps of a fixed-step run); the last step is
+        shortened to end exactly there
+    max_length (float): Stop after this arc length; the last segment is
+        cut to end exactly there
+    rtol, atol (float): Relative and absolute tolerance on the position,
+        in grid cells (rtol is relative to the coordinates themselves)
+    initial_step, min_step, max_step (float): Step size limits
+    max_cells (float): Longest step, in grid cells at the speed at the
+        start of the step
+    max_steps (int): Most step attempts (accepted or rejected) per line
+
+    Returns:
+    Streamlines: One line per seed, with the number of field evaluations
+        each line cost in `evaluations`
+    """
+    if max_time is None and max_length is None:
+        raise ValueError("pass max_time and/or max_length")
+    vecs = contiguous_field(vecs)
+    points = np.array(seeds, dtype=float).reshape(-1, 2)
+    n_seeds = len(points)
+    active = np.arange(n_seeds)
+    h = np.full(n_seeds, float(initial_step))
+    time = np.zeros(n_seeds)
+    length = np.zeros(n_seeds)
+    k1 = bilinear_sample(vecs, points)
+    evaluations = np.ones(n_seeds, dtype=np.int64)
+    line_ids = [active]
+    recorded = [points]
+
+    for _ in range(max_steps):
+        moving = in_domain(vecs, points) & np.any(k1 != 0, axis=1)
+        active, points, k1 = active[moving], points[moving], k1[moving]
+        h, time, length = h[moving], time[moving], length[moving]
+        if not len(active):
+            break
+        h = np.minimum(h, max_cells / np.linalg.norm(k1, axis=1))
+        if max_time is not None:
+            h = np.minimum(h, max_time - time)
+
+        stages = [k1]
+        for row in DP_A[1:]:
+            increment = sum(weight * k for weight, k in zip(row, stages) if weight)
+            stages.append(bilinear_sample(vecs, points + h[:, None] * increment))
+        evaluations[active] += 6
+        new_points = points + h[:, None] * increment     # last row: the 5th-order solution
+        error = h[:, None] * sum(weight * k for weight, k in zip(DP_E, stages) if weight)
+        scale = atol + rtol * np.maximum(np.abs(points), np.abs(new_points))
+        error = np.sqrt(np.mean((error / scale) ** 2, axis=1))
+        accept = (error <= 1) | (h <= min_step)
+
+        step_length = np.linalg.norm(new_points - points, axis=1)
+        done = np.zeros(len(active), dtype=bool)
+        if max_length is not None:
+            over = accept & (length + step_length >= max_length)
+            cut = (max_length - length[over]) / np.where(step_length[over] > 0, step_length[over], 1)
+            new_points[over] = points[over] + cut[:, None] * (new_points[over] - points[over])
+            step_length[over] = max_length - length[over]
+            done |= over
+        if max_time is not None:
+            done |= accept & (time + h >= max_time)
+
+        line_ids.append(active[accept])
+        recorded.append(new_points[accept])
+        points = np.where(accept[:, None], new_points, points)
+        k1 = np.where(accept[:, None], stages[-1], k1)
+        time = np.where(accept, time + h, time)
+        length = np.where(accept, length + step_length, length)
+        with np.errstate(divide='ignore'):
+            factor = np.clip(0.9 * error ** -0.2, 0.2, 5.0)
+        h = np.clip(h * factor, min_step, max_step)
+
+        active, points, k1 = active[~done], points[~done], k1[~done]
+        h, time, length = h[~done], time[~done], length[~done]
+
+    return Streamlines.from_steps(n_seeds, line_ids, recorded, evaluations)
+
+
+class SpatialHash:
+    """
+    Uniform grid of streamline samples for batched distance queries
+
+    Cells are cell_size wide and cover [0, extent[0]] x [0, extent[1]], so
+    every point within cell_size of a query lies in the 3x3 cells around
+    it. Each cell holds its samples in fixed-size slots (doubled when one
+    overflows), so a batch of queries is a single gather over those
+    slots. Each sample remembers its line and its signed arc length along
+    that line, which lets a line skip its own neighbouring samples.
+    """
+
+    QUERY_ROWS = 4096   # queries gathered at a time, bounds the temporary arrays
+
+    def __init__(self, cell_size, extent, capacity=8):
+        self.cell_size = float(cell_size)
+        self.shape = (int(extent[0] // self.cell_size) + 1, int(extent[1] // self.cell_size) + 1)
+        n_cells = self.shape[0] * self.shape[1]
+        self.count = np.zeros(n_cells, dtype=np.intp)
+        self.points = np.zeros((n_cells, capacity, 2))
+        self.line = np.zeros((n_cells, capacity), dtype=np.intp)
+        self.arc = np.zeros((n_cells, capacity))
+
+    def __len__(self):
+        return int(self.count.sum())
+
+    def _cell_coords(self, points):
+        return np.floor(points / self.cell_size).astype(np.intp)
+
+    def insert(self, points, line=-1, arc=0.0):
+        # Add (n, 2) points; line and arc are scalars or one per point
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if not len(points):
+            return
+        coords = self._cell_coords(points)
+        cell = (np.clip(coords[:, 0], 0, self.shape[0] - 1) * self.shape[1] +
+                np.clip(coords[:, 1], 0, self.shape[1] - 1))
+        order = np.argsort(cell, kind='stable')
+        cell = cell[order]
+        # Slot of every point: after the cell's current samples, in input order
+        slot = self.count[cell] + np.arange(len(cell)) - np.searchsorted(cell, cell)
+        capacity = self.points.shape[1]
+        if slot.max() >= capacity:
+            while capacity <= slot.max():
+                capacity *= 2
+            grow = capacity - self.points.shape[1]
+            self.points = np.pad(self.points, ((0, 0), (0, grow), (0, 0)))
+            self.line = np.pad(self.line, ((0, 0), (0, grow)))
+            self.arc = np.pad(self.arc, ((0, 0), (0, grow)))
+        self.points[cell, slot] = points[order]
+        self.line[cell, slot] = np.broadcast_to(line, len(points))[order]
+        self.arc[cell, slot] = np.broadcast_to(arc, len(points))[order]
+        self.count += np.bincount(cell, minlength=len(self.count))
+
+    def near(self, points, radius, line=None, arc=None, gap=0.0):
+        """
+        Which points have a stored sample within radius (at most cell_size)
+
+        Parameters:
+        points (ndarray): (n, 2) query points
+        radius (float): Search distance
+        line (int), arc (ndarray): Line of the queries and the arc length
+            of each. Samples of that line less than `gap` away along it
+            are ignored
+
+        Returns:
+        ndarray: (n,) bool
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        result = np.zeros(len(points), dtype=bool)
+        offsets = np.array([(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1)])
+        for begin in range(0, len(points), self.QUERY_ROWS):
+            query = points[begin:begin + self.QUERY_ROWS]
+            coords = self._cell_coords(query)[:, None] + offsets
+            valid = ((coords[..., 0] >= 0) & (coords[..., 0] < self.shape[0]) &
+                     (coords[..., 1] >= 0) & (coords[..., 1] < self.shape[1]))
+            cell = np.where(valid, coords[..., 0] * self.shape[1] + coords[..., 1], 0)
+            count = np.where(valid, self.count[cell], 0)
+            # Only gather the slots in use somewhere in this neighbourhood
+            used = count.max(initial=0)
+            hit = np.arange(used) < count[..., None]
+            hit &= np.sum((self.points[cell, :used] - query[:, None, None]) ** 2, axis=-1) < radius * radius
+            if line is not None:
+                along = np.abs(self.arc[cell, :used] - arc[begin:begin + len(query), None, None])
+                hit &= (self.line[cell, :used] != line) | (along >= gap)
+            result[begin:begin + len(query)] = hit.any(axis=(1, 2))
+        return result
+
+
+def _unit_tracer(vecs, step_length):
+    """
+    Scalar RK4 step along the normalized field, for tracing one line
+
+    A line is traced one point after another, and on one point each NumPy
+    call costs more than the arithmetic, so this is bilinear_sample written
+    out on Python floats over a flat view of the field. As there, points
+    outside the domain sample a zero vector.
+
+    Returns:
+    function: step(x, y, sign) -> (x, y) after one step of step_length
+    """
+    nx, ny = vecs.shape[:2]
+    field = memoryview(vecs.reshape(-1))
+    xmax, ymax = nx - 1, ny - 1
+
+    def direction(x, y):
+        if not (0 <= x < xmax and 0 <= y < ymax):
+            return 0.0, 0.0
+        x1, y1 = int(x), int(y)
+        fx, fy = x - x1, y - y1
+        i = 2 * (x1 * ny + y1)
+        j = i + 2 * ny
+        w00, w10, w01, w11 = (1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy
+        u = field[i] * w00 + field[j] * w10 + field[i + 2] * w01 + field[j + 2] * w11
+        v = field[i + 1] * w00 + field[j + 1] * w10 + field[i + 3] * w01 + field[j + 3] * w11
+        speed = math.hypot(u, v)
+        return (u / speed, v / speed) if speed > 0 else (0.0, 0.0)
+
+    def step(x, y, sign):
+        h = sign * step_length
+        k1x, k1y = direction(x, y)
+        k2x, k2y = direction(x + 0.5 * h * k1x, y + 0.5 * h * k1y)
+        k3x, k3y = direction(x + 0.5 * h * k2x, y + 0.5 * h * k2y)
+        k4x, k4y = direction(x + h * k3x, y + h * k3y)
+        return x + h * (k1x + 2 * k2x + 2 * k3x + k4x) / 6, y + h * (k1y + 2 * k2y + 2 * k3y + k4y) / 6
+
+    return step
+
+
+def evenly_spaced_streamlines(vecs, separation, test_ratio=0.5, step_length=None, seed=None,
+                              loop_gap=3.0, max_points=10000, chunk=32):
+    """
+    Evenly-spaced streamlines (Jobard & Lefer, 1997)
+
+    Starting from `seed`, every line is traced forward, then backward, with
+    unit-speed RK4 steps and stops where it leaves the domain, reaches a
+    zero of the field, or comes within test_ratio * separation of a sample
+    of another line (or of itself, more than loop_gap * separation back
+    along it). New seeds are tried at +-separation normal to every sample
+    of each finished line, in order, and kept when no sample lies within
+    separation; when those run out, a grid of candidates with the same
+    spacing fills regions the lines never reached.
+
+    All distance checks go through a SpatialHash in batches: a front is
+    integrated `chunk` steps ahead (at most loop_gap * separation, so a
+    chunk cannot close a loop on itself) and checked at once, then cut
+    before its first sample that is too close; the candidate seeds of a
+    line are filtered together and again after every line traced from them.
+
+    Parameters:
+    vecs (ndarray): (nx, ny, 2) vector field indexed [x, y]
+    separation (float): Distance between neighbouring lines, in grid cells
+    test_ratio (float): Fraction of separation at which a line stops
+    step_length (float): Arc length of a step, separation / 10 if None
+    seed (tuple): First seed in (x, y), the centre of the domain if None
+    loop_gap (float): Arc length, in separations, a line must travel
+        before its own samples count as obstacles
+    max_points (int): Most steps each way per line
+    chunk (int): Steps integrated between distance checks
+
+    Returns:
+    Streamlines: The lines, each ordered along the flow, with the number
+        of field evaluations each cost in `evaluations`
+    """
+    vecs = contiguous_field(vecs)
+    nx, ny = vecs.shape[:2]
+    if step_length is None:
+        step_length = separation / 10
+    if seed is None:
+        seed = ((nx - 1) / 2, (ny - 1) / 2)
+    d_test = test_ratio * separation
+    gap = loop_gap * separation
+    chunk = max(1, min(chunk, int(gap / step_length)))
+    min_move = (step_length / 4) ** 2
+    step = _unit_tracer(vecs, step_length)
+    grid = SpatialHash(separation, (nx - 1, ny - 1))
+    lines, evaluations = [], []
+
+    def seedable(candidates):
+        ok = in_domain(vecs, candidates)
+        ok[ok] = np.any(bilinear_sample(vecs, candidates[ok]) != 0, axis=1)
+        ok[ok] = ~grid.near(candidates[ok], separation)
+        return ok
+
+    def trace_front(x, y, sign, line):
+        # Samples of one front, inserted into the hash as they are accepted
+        samples, cost = [], 0
+        while len(samples) < max_points:
+            block = []
+            stopped = False
+            for _ in range(min(chunk, max_points - len(samples))):
+                new_x, new_y = step(x, y, sign)
+                cost += 4
+                if not (0 <= new_x < nx - 1 and 0 <= new_y < ny - 1) or \
+                        (new_x - x) ** 2 + (new_y - y) ** 2 <= min_move:
+                    stopped = True
+                    break
+                x, y = new_x, new_y
+                block.append((x, y))
+            if block:
+                block = np.array(block)
+                arc = sign * step_length * np.arange(len(samples) + 1, len(samples) + len(block) + 1)
+                blocked = grid.near(block, d_test, line, arc, gap)
+                if blocked.any():
+                    cut = np.argmax(blocked)
+                    block, arc, stopped = block[:cut], arc[:cut], True
+                grid.insert(block, line, arc)
+                samples.extend(block)
+            if stopped or not len(block):
+                break
+        return np.array(samples).reshape(-1, 2), cost
+
+    def trace(start):
+        line = len(lines)
+        grid.insert(start, line, 0.0)
+        forward, forward_cost = trace_front(start[0], start[1], 1.0, line)
+        backward, backward_cost = trace_front(start[0], start[1], -1.0, line)
+        samples = np.concatenate([backward[::-1], start[None], forward])
+        lines.append(samples)
+        evaluations.append(forward_cost + backward_cost)
+        return samples
+
+    def seed_from(candidates):
+        # Trace from candidates in order, refiltering after every new line
+        candidates = candidates[seedable(candidates)]
+        while len(candidates):
+            samples = trace(candidates[0])
+            if len(samples) > 1:
+                queue.append(samples)
+            candidates = candidates[1:]
+            candidates = candidates[seedable(candidates)]
+
+    queue = []
+    seed_from(np.array([seed], dtype=float))
+    fallback = np.mgrid[0:nx - 1:separation, 0:ny - 1:separation].reshape(2, -1).T.astype(float)
+    while True:
+        if not queue:
+            if fallback is None:
+                break
+            seed_from(fallback)
+            fallback = None
+            continue
+        samples = queue.pop(0)
+        tangent = np.gradient(samples, axis=0)
+        tangent /= np.maximum(np.linalg.norm(tangent, axis=1, keepdims=True), 1e-12)
+        normal = np.column_stack([-tangent[:, 1], tangent[:, 0]]) * separation
+        seed_from(np.stack([samples + normal, samples - normal], axis=1).reshape(-1, 2))
+
+    offsets = np.zeros(len(lines) + 1, dtype=np.intp)
+    np.cumsum([len(line) for line in lines], out=offsets[1:])
+    points = np.concatenate(lines) if lines else np.empty((0, 2))
+    return Streamlines(points, offsets, np.array(evaluations, dtype=np.int64))
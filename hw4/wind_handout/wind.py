@@ -2,6 +2,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import random
 
+from arrayfile import load_array
+from streamlines import evenly_spaced_streamlines, integrate, integrate_adaptive
+
 def bilinear_interpolation(vecs, x, y):
     x1, x2 = int(x), int(x) + 1
     y1, y2 = int(y), int(y) + 1
@@ -50,32 +53,66 @@ def rk4(vecs, seed_point, step_size, steps):
 
     return points
 
-def plot_figures(step_size, steps, method=euler_method):
+def draw_streamlines(streamlines, title, filename, seeds=None):
 
-    streamlines = [method(vecs, seed_point, step_size, steps) for seed_point in seed_points]
-    
+    # Figures traced from the random seeds also mark the grid points and the seeds
     plt.figure()
-    plt.plot(xx, yy, marker='.', color='b', linestyle='none')
+    if seeds is not None:
+        plt.plot(xx, yy, marker='.', color='b', linestyle='none')
     plt.quiver(xx, yy, vecs_flat[:, 0], vecs_flat[:, 1], width=0.001)
 
-    for seed_point in seed_points:
-        plt.plot(seed_point[0], seed_point[1], marker='.', color='r', linestyle='none')
+    if seeds is not None:
+        for seed_point in seeds:
+            plt.plot(seed_point[0], seed_point[1], marker='.', color='r', linestyle='none')
 
     for streamline in streamlines:
-        streamline = np.array(streamline)
+        streamline = np.asarray(streamline)
         plt.plot(streamline[:, 0], streamline[:, 1], color='r')
 
     plt.xlim(0, 19)
     plt.ylim(0, 19)
 
-    plt.title(f'Wind Data Visualization (Method: {method.__name__}, Step size: {step_size}, Steps: {steps})')
+    plt.title(title)
     plt.xlabel('X axis')
     plt.ylabel('Y axis')
-    plt.savefig(f'wind_data_visualization_method_{method.__name__}_step_size_{step_size}_steps_{steps}).png')
+    plt.savefig(filename)
+
+def plot_figures(step_size, steps, method=euler_method):
+
+    # All seeds are integrated together; same points as calling `method` per seed,
+    # except that rk4 lines stop instead of repeating their last point outside the grid
+    streamlines = integrate(vecs, seed_points, step_size, steps, 'rk4' if method is rk4 else 'euler')
+
+    draw_streamlines(streamlines,
+                     f'Wind Data Visualization (Method: {method.__name__}, Step size: {step_size}, Steps: {steps})',
+                     f'wind_data_visualization_method_{method.__name__}_step_size_{step_size}_steps_{steps}).png',
+                     seeds=seed_points)
+
+def plot_adaptive(max_time, atol):
 
-# Get data
-vecs = np.reshape(np.fromfile("wind_vectors.raw"), (20, 20, 2))
-vecs_flat = np.reshape(vecs, (400, 2))  # useful for plotting
+    # Each line picks its own Dormand-Prince steps to stay within `atol` grid cells;
+    # a line's evaluations are counted until it reaches max_time or leaves the grid
+    streamlines = integrate_adaptive(vecs, seed_points, max_time=max_time, atol=atol)
+
+    draw_streamlines(streamlines,
+                     f'Wind Data Visualization (Method: RK45, Time: {max_time}, Tolerance: {atol},\n'
+                     f'Evaluations/line: {streamlines.evaluations.mean():.0f})',
+                     f'wind_data_visualization_method_rk45_time_{max_time}_atol_{atol}.png',
+                     seeds=seed_points)
+
+def plot_evenly_spaced(separation):
+
+    # Jobard-Lefer seeding instead of random seeds: lines start and stop so
+    # that neighbours stay about `separation` grid cells apart
+    streamlines = evenly_spaced_streamlines(vecs, separation)
+
+    draw_streamlines(streamlines,
+                     f'Wind Data Visualization (Evenly spaced, Separation: {separation}, Lines: {len(streamlines)})',
+                     f'wind_data_visualization_evenly_spaced_separation_{separation}.png')
+
+# Get data (memory-mapped; an array container would record its own dtype and shape)
+vecs = load_array("wind_vectors.raw", dtype=float, shape=(20, 20, 2))
+vecs_flat = vecs.reshape(-1, 2)  # useful for plotting
 vecs = vecs.transpose(1, 0, 2)  # needed otherwise vectors don't match with plot
 
 # X and Y coordinates of points where each vector is in space
@@ -112,5 +149,15 @@ plot_figures(step_size=0.15, steps=16, method=rk4)
 plot_figures(step_size=0.075, steps=32, method=rk4)
 plot_figures(step_size=0.0375, steps=64, method=rk4)
 
+# Adaptive RK45 up to t = 0.2, which every line starting inside the grid reaches
+# before it leaves (the sweep above runs to 2.4, long after most lines exit).
+# Fixed-step rk4 costs 4 field evaluations per step over the same time:
+# 32 per line at 8 steps, 64 at 16
+plot_adaptive(max_time=0.2, atol=1e-3)
+plot_adaptive(max_time=0.2, atol=1e-4)
+
+# Evenly-spaced streamlines
+plot_evenly_spaced(separation=1.0)
+
 # Show all plots
 plt.show()
\ No newline at end of file
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from arrayfile import load_array, save_array, verify_array
+
+
+@pytest.mark.parametrize('shape', [(0,), (0, 2, 2), (3, 0), (2, 0, 4), ()])
+def test_empty_and_scalar_arrays_round_trip(tmp_path, shape):
+    array = np.arange(int(np.prod(shape)), dtype=np.float32).reshape(shape)
+    path = str(tmp_path / 'empty.arr')
+    save_array(path, array)
+    loaded = load_array(path, dtype=np.float32, shape=shape)
+    assert loaded.shape == shape
+    np.testing.assert_array_equal(loaded, array)
+    assert verify_array(path)
+
+
+def test_fortran_order_round_trips(tmp_path):
+    array = np.asfortranarray(np.arange(24, dtype=np.int16).reshape(2, 3, 4))
+    path = str(tmp_path / 'fortran.arr')
+    save_array(path, array)
+    np.testing.assert_array_equal(load_array(path), array)